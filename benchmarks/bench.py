@@ -0,0 +1,256 @@
+"""Benchmarks for the engine hot paths
+
+Runs offline on fixed deal numbers and prints machine readable JSON:
+
+    python -m benchmarks.bench --out before.json
+    python -m benchmarks.bench --compare before.json
+"""
+import argparse
+import io
+import json
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+from src.card_types import get_playing_cards
+from src.deck import Deck
+from src.engine import DRAW, Game
+from src.render import Renderer
+from src.solitaire import Solitaire
+
+DEALS = range(1, 17)
+Benchmark = Callable[[], Callable[[], object]]
+
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def benchmark(name: str) -> Callable[[Benchmark], Benchmark]:
+    """Register a setup function returning the operation to time"""
+
+    def register(setup: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def _games(variant: str) -> list[Game]:
+    return [Game.new(variant, deal) for deal in DEALS]
+
+
+def _midgame(variant: str) -> list[Game]:
+    games = _games(variant)
+    for game in games:
+        for _ in range(20):
+            moves = game.legal_moves()
+            if not moves:
+                break
+            game.apply(moves[-1])
+    return games
+
+
+def _cycle(games: list) -> Callable[[], object]:
+    i = 0
+
+    def next_game():
+        nonlocal i
+        i = (i + 1) % len(games)
+        return games[i]
+
+    return next_game
+
+
+@benchmark("get_playing_cards")
+def bench_get_playing_cards():
+    return lambda: get_playing_cards(card_values=list(range(13)))
+
+
+@benchmark("deal")
+def bench_deal():
+    cards = get_playing_cards(card_values=list(range(13)))
+    deals = iter(range(10**12))
+    return lambda: Deck(cards, shuffled=True, deal=next(deals))
+
+
+@benchmark("init_tableau.klondike")
+def bench_init_klondike():
+    deals = iter(range(10**12))
+    return lambda: Game.new("klondike", next(deals))
+
+
+@benchmark("init_tableau.yukon")
+def bench_init_yukon():
+    deals = iter(range(10**12))
+    return lambda: Game.new("yukon", next(deals))
+
+
+@benchmark("valid_moves.all_pairs")
+def bench_valid_moves():
+    next_game = _cycle(_midgame("yukon"))
+
+    def all_pairs():
+        game = next_game()
+        stacks = game.ACES + game.KINGS + [game.PULL]
+        return [
+            game.stacks[target].valid_moves(game.stacks[source])
+            for target in stacks
+            for source in stacks
+            if source != target
+        ]
+
+    return all_pairs
+
+
+@benchmark("legal_moves.klondike")
+def bench_legal_moves_klondike():
+    next_game = _cycle(_midgame("klondike"))
+    return lambda: next_game().legal_moves()
+
+
+@benchmark("legal_moves.yukon")
+def bench_legal_moves_yukon():
+    next_game = _cycle(_midgame("yukon"))
+    return lambda: next_game().legal_moves()
+
+
+@benchmark("snapshot")
+def bench_snapshot():
+    next_game = _cycle(_midgame("klondike"))
+    return lambda: next_game().snapshot()
+
+
+@benchmark("restore")
+def bench_restore():
+    games = _midgame("klondike")
+    states = [game.snapshot() for game in games]
+    next_game = _cycle(list(zip(games, states)))
+
+    def restore():
+        game, state = next_game()
+        game.restore(state)
+
+    return restore
+
+
+@benchmark("apply_undo")
+def bench_apply_undo():
+    games = _midgame("yukon")
+    next_game = _cycle([(game, game.legal_moves()[0]) for game in games])
+
+    def apply_undo():
+        game, move = next_game()
+        game.apply(move)
+        game.undo()
+
+    return apply_undo
+
+
+@benchmark("hash")
+def bench_hash():
+    next_game = _cycle(_midgame("klondike"))
+    return lambda: hash(next_game())
+
+
+@benchmark("pull_cards")
+def bench_pull_cards():
+    next_game = _cycle(_games("klondike"))
+    return lambda: next_game().apply(DRAW)
+
+
+def _solitaire(game: Game) -> Solitaire:
+    solitaire = Solitaire()
+    solitaire.type = game.variant
+    solitaire.game = game
+    return solitaire
+
+
+@benchmark("render.str")
+def bench_render_str():
+    next_board = _cycle([_solitaire(game) for game in _midgame("klondike")])
+    return lambda: str(next_board())
+
+
+@benchmark("render.diff")
+def bench_render_diff():
+    game = _midgame("klondike")[0]
+    board = _solitaire(game)
+    renderer = Renderer(io.StringIO())
+    renderer.draw(board._frame())
+
+    def redraw():
+        game.apply(DRAW)
+        renderer.out.seek(0)
+        renderer.out.truncate()
+        renderer.draw(board._frame())
+
+    return redraw
+
+
+def run(name: str, setup: Benchmark, min_time: float) -> dict:
+    """Time one benchmark and measure the memory its operations allocate
+
+    Returns:
+        dict: ops per second, mean time per op and allocation figures
+    """
+    op = setup()
+    ops = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    batch = 1
+    while elapsed < min_time:
+        for _ in range(batch):
+            op()
+        ops += batch
+        batch *= 2
+        elapsed = time.perf_counter() - start
+
+    sample = min(ops, 1000)
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    kept = [op() for _ in range(sample)]
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+
+    return {
+        "name": name,
+        "ops": ops,
+        "ops_per_sec": ops / elapsed,
+        "usec_per_op": elapsed / ops * 1e6,
+        "bytes_per_op": (after - before) / sample,
+        "peak_bytes": peak - before,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the engine hot paths")
+    parser.add_argument("--filter", default="", help="only run names containing this")
+    parser.add_argument("--min-time", type=float, default=0.5)
+    parser.add_argument("--out", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="print speedups against an older report")
+    args = parser.parse_args(argv)
+
+    results = [
+        run(name, setup, args.min_time)
+        for name, setup in BENCHMARKS.items()
+        if args.filter in name
+    ]
+    report = {"python": sys.version.split()[0], "deals": len(DEALS), "results": results}
+
+    if args.out:
+        with open(args.out, "w") as out:
+            json.dump(report, out, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = {r["name"]: r for r in json.load(baseline_file)["results"]}
+        for result in results:
+            if result["name"] in baseline:
+                old = baseline[result["name"]]["ops_per_sec"]
+                result["speedup"] = result["ops_per_sec"] / old
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
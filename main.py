@@ -1,12 +1,45 @@
+import os
+from typing import Iterator
+
+from src.cache import VerdictCache
+from src.metrics import METRICS
+from src.record import Recorder
 from src.solitaire import Solitaire
 
 
-def main():
-    game = Solitaire()
-    continue_play = game.start_game()
-    if continue_play:
-        main()
+def main(
+    recorder: Recorder | None = None,
+    cache: VerdictCache | None = None,
+    deals: Iterator[int] | None = None,
+):
+    Solitaire(recorder, cache).run(deals)
+
+
+def read_deals(path: str) -> Iterator[int]:
+    """Deal numbers of a file with one per line, as written by `src.deals`"""
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                yield int(line)
 
 
 if __name__ == "__main__":
-    main()
+    # SOLITAIRE_METRICS=metrics.prom python main.py dumps metrics every 10 seconds
+    metrics_path = os.environ.get("SOLITAIRE_METRICS")
+    if metrics_path:
+        fmt = "prometheus" if metrics_path.endswith(".prom") else "json"
+        METRICS.start_dump(metrics_path, fmt=fmt)
+    # SOLITAIRE_RECORD=games.rec python main.py appends every game to a record file
+    record_path = os.environ.get("SOLITAIRE_RECORD")
+    recorder = Recorder(record_path) if record_path else None
+    # SOLITAIRE_CACHE=verdicts.db keeps solver verdicts between sessions
+    cache = VerdictCache(os.environ.get("SOLITAIRE_CACHE"))
+    # SOLITAIRE_DEALS=deals.txt plays the deals of a pool in order, then random ones
+    deals_path = os.environ.get("SOLITAIRE_DEALS")
+    try:
+        main(recorder, cache, read_deals(deals_path) if deals_path else None)
+    finally:
+        METRICS.stop_dump()
+        if recorder:
+            recorder.close()
+        cache.close()
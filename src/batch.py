@@ -0,0 +1,424 @@
+"""Many games stepped in lockstep with NumPy
+
+`BatchGames` keeps N games as arrays instead of `Card` and `Stack`
+objects. Every card also has its location stored, so like
+`Game.legal_moves` each destination only checks the few cards it takes
+and a legal move mask costs a handful of array lookups per game:
+
+    games = BatchGames(range(10_000), "yukon")
+    mask = games.legal_mask()
+    games.apply(random_actions(mask, rng))
+
+Actions are numbered the same for every game. Action `4 * column + slot`
+moves the `slot`-th card that fits on the top of that column together
+with the cards on it, `FOUNDATION + suit` moves the next card of a suit to
+its foundation and `DRAW_ACTION` draws from the stock.
+
+Requires NumPy.
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+import numpy as np
+
+from src.card_types import SUITS
+from src.deals import COLUMNS, DECK_SIZE, RANKS, deal_orders, layout
+from src.engine import DRAW, Game, Move
+from src.stack import EMPTY, TABLEAU_OK
+
+SLOTS = 4
+FOUNDATION = COLUMNS * SLOTS
+DRAW_ACTION = FOUNDATION + len(SUITS)
+ACTIONS = DRAW_ACTION + 1
+NO_ACTION = -1
+
+# Card locations besides the tableau columns 0-6, a foundation per suit
+# and a place for the `EMPTY` padding of the candidate tables
+STOCK = COLUMNS
+FOUNDED = COLUMNS + 1
+NOWHERE = FOUNDED + len(SUITS)
+LOCATIONS = NOWHERE + 1
+# Room per column, no column can hold more than the whole deck
+MAX_HEIGHT = DECK_SIZE
+
+# Cards that can be placed on a top card, padded with EMPTY
+_NEEDS = np.full((EMPTY + 1, SLOTS), EMPTY, dtype=np.intp)
+for _top, _row in enumerate(TABLEAU_OK):
+    _fits = [card for card, ok in enumerate(_row) if ok]
+    _NEEDS[_top, : len(_fits)] = _fits
+
+
+class BatchGames:
+    """State of many games of one variant as NumPy arrays
+
+    Array lookups go through flat indexes, `np.take` on a raveled array is
+    several times faster than indexing rows and columns separately.
+
+    Args:
+        deals (Iterable[int]): Deal numbers, dealt like `Game.new`
+        variant (str, optional): 'klondike' or 'yukon'. Defaults to "klondike".
+        draw (int, optional): Cards turned per draw in klondike. Defaults to 3.
+
+    Attributes:
+        tableau (np.ndarray): Card ids of every column from the bottom, (N, 7, 52)
+        height (np.ndarray): Cards in each column, (N, 7)
+        hidden (np.ndarray): Face down cards at the bottom of each column, (N, 7)
+        foundation (np.ndarray): Cards on the foundation of each suit, (N, 4)
+        stock (np.ndarray): Stock and waste in drawing order, (N, 24)
+        stock_size (np.ndarray): Cards left in stock and waste, (N,)
+        cursor (np.ndarray): Cards drawn this pass, the waste is `stock[:cursor]`, (N,)
+        location (np.ndarray): Column, `STOCK` or `FOUNDED + suit` of every card id, (N, 53)
+        position (np.ndarray): Index of every card in its column, the stock or its foundation, (N, 53)
+        moves (np.ndarray): Moves played, draws not counted, (N,)
+    """
+
+    def __init__(self, deals, variant: str = "klondike", draw: int = 3) -> None:
+        deals = np.fromiter(deals, dtype=np.uint64)
+        n = len(deals)
+        orders = deal_orders(deals)
+        columns, hidden = layout(variant)
+        rows = np.arange(n)
+        self.variant: str = variant
+        self.draw: int = draw
+        self.size: int = n
+        self._card_rows = rows[:, None] * (EMPTY + 1)
+        self._column_rows = rows[:, None] * COLUMNS + np.arange(COLUMNS)
+        self._location_rows = rows[:, None] * LOCATIONS
+
+        self.tableau = np.full((n, COLUMNS, MAX_HEIGHT), EMPTY, dtype=np.uint8)
+        self.height = np.zeros((n, COLUMNS), dtype=np.intp)
+        self.hidden = np.tile(np.array(hidden, dtype=np.intp), (n, 1))
+        self.foundation = np.zeros((n, len(SUITS)), dtype=np.intp)
+        self.location = np.full((n, EMPTY + 1), NOWHERE, dtype=np.int8)
+        self.position = np.zeros((n, EMPTY + 1), dtype=np.int8)
+        for col, positions in enumerate(columns):
+            for depth, deck_position in enumerate(positions):
+                cards = orders[:, deck_position]
+                self.tableau[:, col, depth] = cards
+                self.location[rows, cards] = col
+                self.position[rows, cards] = depth
+            self.height[:, col] = len(positions)
+
+        # What is left of the deck is drawn from its bottom card up
+        dealt = sum(len(positions) for positions in columns)
+        self.stock = orders[:, : DECK_SIZE - dealt].copy()
+        self.stock_size = np.full(n, DECK_SIZE - dealt, dtype=np.intp)
+        self.cursor = np.zeros(n, dtype=np.intp)
+        for index in range(DECK_SIZE - dealt):
+            self.location[rows, self.stock[:, index]] = STOCK
+            self.position[rows, self.stock[:, index]] = index
+        self.moves = np.zeros(n, dtype=np.intp)
+
+    def tops(self) -> np.ndarray:
+        """Top card id of every column, `EMPTY` for an empty one"""
+        depth = np.maximum(self.height - 1, 0)
+        top = np.take(self.tableau, self._column_rows * MAX_HEIGHT + depth)
+        return np.where(self.height > 0, top, EMPTY)
+
+    def _bounds(self) -> tuple[np.ndarray, np.ndarray]:
+        """Lowest and highest position a card can be moved from, per location
+
+        Face up cards of a column, the top of the waste and foundation tops
+        other than aces. A card can leave its place when its position lies
+        within the bounds of its location.
+        """
+        n = self.size
+        low = np.empty((n, LOCATIONS), dtype=np.int8)
+        high = np.empty((n, LOCATIONS), dtype=np.int8)
+        low[:, :COLUMNS] = self.hidden
+        high[:, :COLUMNS] = self.height - 1
+        low[:, STOCK] = high[:, STOCK] = self.cursor - 1
+        top = self.foundation - 1
+        low[:, FOUNDED:NOWHERE] = np.where(top > 0, top, MAX_HEIGHT)
+        high[:, FOUNDED:NOWHERE] = top
+        low[:, NOWHERE] = MAX_HEIGHT
+        high[:, NOWHERE] = -1
+        return low, high
+
+    def legal_mask(self) -> np.ndarray:
+        """Legal actions of every game, (N, ACTIONS) booleans"""
+        n = self.size
+        mask = np.zeros((n, ACTIONS), dtype=bool)
+        low, high = self._bounds()
+
+        tops = self.tops()
+        cards = np.take(_NEEDS, tops, axis=0) + self._card_rows[:, :, None]
+        location = np.take(self.location, cards)
+        position = np.take(self.position, cards)
+        bounds = location + self._location_rows[:, :, None]
+        movable = (np.take(low, bounds) <= position) & (
+            position <= np.take(high, bounds)
+        )
+        target = np.arange(COLUMNS)[None, :, None]
+        # A King already heading a column stays there
+        heading = (position == 0) & (location < COLUMNS) & (tops == EMPTY)[..., None]
+        tableau_ok = movable & (location != target) & ~heading
+        mask[:, :FOUNDATION] = tableau_ok.reshape(n, -1)
+
+        cards = np.arange(len(SUITS)) * RANKS + self.foundation
+        cards = np.where(self.foundation < RANKS, cards, EMPTY) + self._card_rows
+        location = np.take(self.location, cards)
+        position = np.take(self.position, cards)
+        # Only the top card of a column or of the waste goes up
+        on_top = position == np.take(high, location + self._location_rows)
+        mask[:, FOUNDATION:DRAW_ACTION] = (location <= STOCK) & on_top
+
+        if self.variant == "klondike":
+            mask[:, DRAW_ACTION] = self.stock_size > 0
+        return mask
+
+    def action_cards(self, actions: np.ndarray) -> np.ndarray:
+        """Card each action moves, `EMPTY` for draws and no action"""
+        actions = np.asarray(actions)
+        rows = np.arange(self.size)
+        tops = self.tops()
+        column = np.clip(actions // SLOTS, 0, COLUMNS - 1)
+        slot = actions % SLOTS
+        tableau = np.take(_NEEDS.ravel(), tops[rows, column] * SLOTS + slot)
+        suit = np.clip(actions - FOUNDATION, 0, len(SUITS) - 1)
+        founded = suit * RANKS + self.foundation[rows, suit]
+        cards = np.where(actions < FOUNDATION, tableau, founded)
+        return np.where((actions >= 0) & (actions < DRAW_ACTION), cards, EMPTY)
+
+    def apply(self, actions: np.ndarray) -> None:
+        """Play one action in every game, `NO_ACTION` leaves a game as is
+
+        The actions must be legal, as given by `legal_mask`.
+        """
+        actions = np.asarray(actions)
+        cards = self.action_cards(actions)
+        self._draw(np.flatnonzero(actions == DRAW_ACTION))
+        moving = np.flatnonzero(cards < DECK_SIZE)
+        if not len(moving):
+            return
+
+        cards = cards[moving]
+        actions = actions[moving]
+        card_index = moving * (EMPTY + 1) + cards
+        source = np.take(self.location, card_index).astype(np.intp)
+        start = np.take(self.position, card_index).astype(np.intp)
+        self.moves[moving] += 1
+
+        # Cards leave their source, runs only from the tableau
+        from_tableau = source < COLUMNS
+        column = np.minimum(source, COLUMNS - 1)
+        column_index = moving * COLUMNS + column
+        length = np.where(from_tableau, np.take(self.height, column_index) - start, 1)
+        offsets = np.arange(length.max())
+        depth = np.minimum(start[:, None] + offsets, MAX_HEIGHT - 1)
+        run = np.take(self.tableau, column_index[:, None] * MAX_HEIGHT + depth)
+        run[~from_tableau, 0] = cards[~from_tableau]
+
+        from_waste = source == STOCK
+        if from_waste.any():
+            self._take_waste(moving[from_waste])
+        from_foundation = source >= FOUNDED
+        suits = source[from_foundation] - FOUNDED
+        self.foundation[moving[from_foundation], suits] -= 1
+        games = moving[from_tableau]
+        column, start = column[from_tableau], start[from_tableau]
+        self.height[games, column] = start
+        # The new top of the column turns face up
+        flip = (self.hidden[games, column] == start) & (start > 0)
+        self.hidden[games[flip], column[flip]] -= 1
+
+        # Cards arrive at a column or their foundation
+        onto_column = actions < FOUNDATION
+        self._place(
+            moving[onto_column],
+            actions[onto_column] // SLOTS,
+            run[onto_column],
+            length[onto_column],
+        )
+        onto_foundation = ~onto_column
+        games, cards = moving[onto_foundation], cards[onto_foundation]
+        self.foundation[games, cards // RANKS] += 1
+        self.location[games, cards] = FOUNDED + cards // RANKS
+        self.position[games, cards] = cards % RANKS
+
+    def _place(
+        self,
+        games: np.ndarray,
+        columns: np.ndarray,
+        cards: np.ndarray,
+        length: np.ndarray,
+    ) -> None:
+        """Put runs of cards, padded to the same width, on top of columns"""
+        column_index = games * COLUMNS + columns
+        height = np.take(self.height, column_index)
+        offsets = np.arange(cards.shape[1])
+        runs, offset = (offsets < length[:, None]).nonzero()
+        cards = cards[runs, offset]
+        depth = height[runs] + offset
+        self.tableau.put(column_index[runs] * MAX_HEIGHT + depth, cards)
+        card_index = games[runs] * (EMPTY + 1) + cards
+        self.location.put(card_index, columns[runs])
+        self.position.put(card_index, depth)
+        self.height.put(column_index, height + length)
+
+    def _take_waste(self, games: np.ndarray) -> None:
+        """Remove the top of the waste, closing the gap in the stock array"""
+        index = self.cursor[games] - 1
+        size = self.stock_size[games]
+        width = self.stock.shape[1]
+        offsets = np.arange(width)
+        shift = (offsets >= index[:, None]) & (offsets < size[:, None] - 1)
+        rows, at = shift.nonzero()
+        cards = self.stock[games[rows], at + 1]
+        self.stock[games[rows], at] = cards
+        self.position[games[rows], cards] = at
+        self.cursor[games] -= 1
+        self.stock_size[games] -= 1
+
+    def _draw(self, games: np.ndarray) -> None:
+        cursor = self.cursor[games]
+        size = self.stock_size[games]
+        # An empty stock turns the waste over before drawing
+        cursor = np.where(cursor >= size, 0, cursor)
+        self.cursor[games] = np.minimum(cursor + self.draw, size)
+
+    @property
+    def won(self) -> np.ndarray:
+        """Games with every card on the foundations"""
+        return self.foundation.sum(axis=1) == DECK_SIZE
+
+    def to_move(self, game: int, action: int) -> Move:
+        """The `Game` move an action stands for in one game"""
+        if action == DRAW_ACTION:
+            return DRAW
+        card = int(self.action_cards(_one_hot(self.size, game, action))[game])
+        location = int(self.location[game, card])
+        position = int(self.position[game, card])
+        if location < COLUMNS:
+            source = Game.KINGS[location]
+        elif location == STOCK:
+            source = Game.PULL
+        else:
+            source = SUITS[location - FOUNDED]
+        if action >= FOUNDATION:
+            return Move(source, SUITS[action - FOUNDATION], position)
+        return Move(source, Game.KINGS[action // SLOTS], position)
+
+
+def _one_hot(size: int, game: int, action: int) -> np.ndarray:
+    actions = np.full(size, NO_ACTION)
+    actions[game] = action
+    return actions
+
+
+def random_actions(mask: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """A uniformly random legal action per game, `NO_ACTION` when there is none"""
+    scores = rng.random(mask.shape, dtype=np.float32) * mask
+    actions = scores.argmax(axis=1)
+    return np.where(mask.any(axis=1), actions, NO_ACTION)
+
+
+def rollout(
+    games: BatchGames, plies: int, rng: np.random.Generator | None = None
+) -> dict:
+    """Play random legal moves in every game for `plies` steps
+
+    Returns:
+        dict: Games, wins, actions played and actions per second
+    """
+    rng = rng or np.random.default_rng()
+    played = 0
+    start = perf_counter()
+    for _ in range(plies):
+        mask = games.legal_mask()
+        actions = random_actions(mask, rng)
+        actions[games.won] = NO_ACTION
+        played += int((actions != NO_ACTION).sum())
+        games.apply(actions)
+    elapsed = perf_counter() - start
+    return {
+        "games": games.size,
+        "wins": int(games.won.sum()),
+        "actions": played,
+        "seconds": elapsed,
+        "actions_per_second": played / elapsed if elapsed else 0.0,
+    }
+
+
+def _rollout_chunk(
+    variant: str, deals: range, draw: int, plies: int, seed: int
+) -> dict:
+    games = BatchGames(deals, variant, draw)
+    return rollout(games, plies, np.random.default_rng([seed, deals.start]))
+
+
+def parallel_rollouts(
+    variant: str,
+    deals: range,
+    draw: int = 3,
+    plies: int = 200,
+    workers: int | None = None,
+    chunk_size: int = 8192,
+    seed: int = 0,
+) -> dict:
+    """Random rollouts of numbered deals across a pool of processes
+
+    Every worker steps a whole chunk of deals with one `BatchGames`, the
+    chunks are large enough to keep NumPy busy and small enough to stay in
+    cache.
+
+    Args:
+        variant (str): 'klondike' or 'yukon'
+        deals (range): Numbers of the deals to play
+        draw (int, optional): Cards turned per draw in klondike. Defaults to 3.
+        plies (int, optional): Steps of every rollout. Defaults to 200.
+        workers (int, optional): Worker processes. Defaults to None (one per core).
+        chunk_size (int, optional): Deals per task. Defaults to 8192.
+        seed (int, optional): Seed of the random moves. Defaults to 0.
+
+    Returns:
+        dict: Games, wins, actions played and actions per second over all workers
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = [deals[i : i + chunk_size] for i in range(0, len(deals), chunk_size)]
+    start = perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(
+            executor.map(
+                _rollout_chunk,
+                [variant] * len(chunks),
+                chunks,
+                [draw] * len(chunks),
+                [plies] * len(chunks),
+                [seed] * len(chunks),
+            )
+        )
+    elapsed = perf_counter() - start
+    actions = sum(result["actions"] for result in results)
+    return {
+        "games": len(deals),
+        "wins": sum(result["wins"] for result in results),
+        "actions": actions,
+        "seconds": elapsed,
+        "actions_per_second": actions / elapsed if elapsed else 0.0,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Random rollouts of many games")
+    parser.add_argument("--variant", choices=("klondike", "yukon"), default="klondike")
+    parser.add_argument("--draw", type=int, choices=(1, 3), default=3)
+    parser.add_argument("--games", type=int, default=10_000)
+    parser.add_argument("--first-deal", type=int, default=0)
+    parser.add_argument("--plies", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    deals = range(args.first_deal, args.first_deal + args.games)
+    result = parallel_rollouts(
+        args.variant, deals, args.draw, args.plies, args.workers, seed=args.seed
+    )
+    print(json.dumps({"variant": args.variant, **result}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import sqlite3
+from collections import OrderedDict
+from typing import NamedTuple
+
+from src.solver import Verdict
+
+_VERDICTS = list(Verdict)
+
+
+class CachedVerdict(NamedTuple):
+    """Verdict of a position and the node budget it was searched with"""
+
+    verdict: Verdict
+    nodes: int
+
+
+class VerdictCache:
+    """Solver verdicts keyed by position, an LRU in memory in front of sqlite
+
+    Solvable and unsolvable verdicts are final. An unknown verdict only
+    answers searches with at most the node budget that produced it, a
+    bigger budget has to search again.
+
+    Every verdict is committed as it is stored, so processes can share
+    one file and a crash loses nothing. When the file cannot be used, for
+    example because another process holds it locked for too long, the
+    cache carries on in memory only and `stats` tells why.
+
+    Args:
+        path (str, optional): sqlite file for the disk tier. Defaults to None (memory only).
+        capacity (int, optional): Positions kept in memory. Defaults to 100_000.
+        disk_capacity (int, optional): Positions kept on disk. Defaults to 10_000_000.
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        capacity: int = 100_000,
+        disk_capacity: int = 10_000_000,
+    ) -> None:
+        self.path: str | None = path
+        self.capacity: int = capacity
+        self.disk_capacity: int = disk_capacity
+        self.hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+        self._memory: OrderedDict[int, CachedVerdict] = OrderedDict()
+        self._db: sqlite3.Connection | None = None
+        self._disk_size: int = 0
+        self.disk_error: str | None = None
+        if path:
+            try:
+                # Autocommit, transactions are opened and closed explicitly
+                self._db = sqlite3.connect(path, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode = WAL")
+                self._db.execute("PRAGMA synchronous = NORMAL")
+                self._db.execute("PRAGMA mmap_size = 268435456")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS verdicts "
+                    "(key INTEGER NOT NULL UNIQUE, verdict INTEGER, nodes INTEGER)"
+                )
+                (self._disk_size,) = self._db.execute(
+                    "SELECT COUNT(*) FROM verdicts"
+                ).fetchone()
+            except sqlite3.OperationalError as error:
+                self._drop_disk(error)
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def get(self, key: int, nodes: int = 0) -> CachedVerdict | None:
+        """Verdict of a position good enough for a search of `nodes` nodes"""
+        from_disk = False
+        cached = self._memory.get(key)
+        if cached is not None:
+            self._memory.move_to_end(key)
+        elif self._db is not None:
+            try:
+                row = self._db.execute(
+                    "SELECT verdict, nodes FROM verdicts WHERE key = ?",
+                    (_signed(key),),
+                ).fetchone()
+            except sqlite3.OperationalError as error:
+                self._drop_disk(error)
+                row = None
+            if row is not None:
+                cached = CachedVerdict(_VERDICTS[row[0]], row[1])
+                self._remember(key, cached)
+                from_disk = True
+
+        if cached is None or (
+            cached.verdict == Verdict.UNKNOWN and cached.nodes < nodes
+        ):
+            self.misses += 1
+            return None
+        self.hits += 1
+        if from_disk:
+            self.disk_hits += 1
+        return cached
+
+    def put(self, key: int, verdict: Verdict, nodes: int = 0) -> None:
+        cached = CachedVerdict(verdict, nodes)
+        self._remember(key, cached)
+        if self._db is None:
+            return
+        try:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._store(key, verdict, nodes)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+        except sqlite3.OperationalError as error:
+            self._drop_disk(error)
+
+    def _store(self, key: int, verdict: Verdict, nodes: int) -> None:
+        # Deleting first moves a stored key to the newest row, and tells
+        # whether the file grew
+        replaced = self._db.execute(
+            "DELETE FROM verdicts WHERE key = ?", (_signed(key),)
+        ).rowcount
+        self._db.execute(
+            "INSERT INTO verdicts (key, verdict, nodes) VALUES (?, ?, ?)",
+            (_signed(key), _VERDICTS.index(verdict), nodes),
+        )
+        if not replaced:
+            self._disk_size += 1
+        if self._disk_size > self.disk_capacity:
+            # Oldest rows go first, a tenth of the file at a time
+            excess = self._disk_size - self.disk_capacity + self.disk_capacity // 10
+            self._db.execute(
+                "DELETE FROM verdicts WHERE rowid IN "
+                "(SELECT rowid FROM verdicts ORDER BY rowid LIMIT ?)",
+                (excess,),
+            )
+            (self._disk_size,) = self._db.execute(
+                "SELECT COUNT(*) FROM verdicts"
+            ).fetchone()
+
+    def _drop_disk(self, error: sqlite3.OperationalError) -> None:
+        # Verdicts already committed stay in the file for the next session
+        self.disk_error = str(error)
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, key: int, cached: CachedVerdict) -> None:
+        self._memory[key] = cached
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_size": len(self._memory),
+            "disk_size": self._disk_size,
+            "disk_error": self.disk_error,
+        }
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def _signed(key: int) -> int:
+    # sqlite integers are signed 64-bit
+    return key - (1 << 64) if key >= 1 << 63 else key
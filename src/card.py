@@ -1,61 +1,81 @@
 class Card:
-    """Card object for card games"""
+    """Immutable card for card games
+
+    Cards hold no game state, whether a card lies face down is up to the
+    stack holding it, so a single instance of each card can be shared by
+    every game and every stored position.
+    """
+
+    __slots__ = ("face", "suit", "front_img", "back_img", "value", "id")
+
+    face: str
+    suit: str
+    front_img: str
+    back_img: str
+    value: int
+    id: int
 
     def __init__(
         self,
         face: str,
         suit: str,
-        face_down: bool = False,
         front_img: str = "",
         back_img: str = "",
         value: int = 0,
+        id: int = 0,
     ) -> None:
-        self.face: str = face
-        self.suit: str = suit
-        self.face_down: bool = face_down
-        self.front_img: str = front_img
-        self.back_img: str = back_img
-        self._value: int = int(value)
-
-    def __eq__(self, __o: "Card") -> bool:
-        return (
-            self.face == __o.face
-            and self.suit == __o.suit
-            and self.face_down == __o.face_down
-        )
+        if not isinstance(value, int):
+            raise ValueError(f"ValueError: Value must be an integer, got {value}")
+        set_attr = object.__setattr__
+        set_attr(self, "face", face)
+        set_attr(self, "suit", suit)
+        set_attr(self, "front_img", front_img)
+        set_attr(self, "back_img", back_img)
+        set_attr(self, "value", value)
+        set_attr(self, "id", id)
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError(f"Card is immutable, cannot set {name}")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"Card is immutable, cannot delete {name}")
+
+    def __eq__(self, __o: object) -> bool:
+        if not isinstance(__o, Card):
+            return NotImplemented
+        return self.face == __o.face and self.suit == __o.suit
 
     def __hash__(self) -> int:
-        return hash((self.face, self.suit, self.face_down))
+        return hash((self.face, self.suit))
 
     def __str__(self) -> str:
         return f"{self.face}{self.suit}"
 
-    def flip(self) -> None:
-        self.face_down = not self.face_down
+    def __repr__(self) -> str:
+        return f"Card({self.face!r}, {self.suit!r})"
 
-    @property
-    def img(self) -> str:
-        return self.back_img if self.face_down else self.front_img
+    def __copy__(self) -> "Card":
+        return self
+
+    def __deepcopy__(self, memo: dict) -> "Card":
+        return self
+
+    def __reduce__(self):
+        # Imported here, card_types builds its cards from this module
+        from src.card_types import _CARDS, playing_card
+
+        # Shared cards unpickle as the shared instance of the loading process
+        key = (self.face, self.suit, self.value)
+        if _CARDS.get(key) is self:
+            return (playing_card, key)
+        # Slots cannot be restored through the blocked __setattr__
+        args = (self.face, self.suit, self.front_img, self.back_img, self.value)
+        return (Card, args + (self.id,))
 
     @property
     def color(self) -> str:
-        if self.face_down:
-            return ""
         if self.suit.lower() in ("h", "d", "hearts", "diamonds"):
             return "Red"
         if self.suit.lower() in ("s", "c", "spades", "clubs"):
             return "Black"
         return ""
-
-    @property
-    def value(self) -> int:
-        return 0 if self.face_down else self._value
-
-    @value.setter
-    def value(self, new_value: int) -> None:
-        if not isinstance(new_value, int):
-            raise ValueError(
-                f"ValueError: New value must be an integer, got {new_value}"
-            )
-
-        self._value = new_value
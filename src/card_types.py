@@ -7,6 +7,17 @@ CARD_COLORS = {
     "S": "\033[48;5;15m\033[38;5;236m",
 }
 SUIT_IMAGES = {"H": "♥", "D": "♦", "C": "♣", "S": "♠"}
+FACES = ("A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K")
+SUITS = ("C", "D", "H", "S")
+BACK_IMG = "\033[48;5;20m --- \033[m"
+
+# Cards are immutable, so every deck shares the same instances
+_CARDS: dict[tuple[str, str, int], Card] = {}
+
+
+def card_id(face: str, suit: str) -> int:
+    """Small integer identifying a card, 0-51 ordered by suit then face"""
+    return SUITS.index(suit) * 13 + FACES.index(face)
 
 
 def card_img(face: str, suit: str) -> str:
@@ -16,21 +27,27 @@ def card_img(face: str, suit: str) -> str:
 def get_playing_cards(
     num_of_decks: int = 1, card_values: list = [0] * 13
 ) -> list[Card]:
-    faces = zip(
-        ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"], card_values
-    )
-    suites = ("C", "D", "H", "S")
+    faces = zip(FACES, card_values)
     deck = [
-        Card(
-            face=f,
-            suit=s,
-            value=v,
-            front_img=card_img(f, s),
-            back_img="\033[48;5;20m --- \033[m",
-            # back_img=" --- ",
-        )
+        playing_card(f, s, v)
         for f, v in faces
-        for s in suites
+        for s in SUITS
         for _ in range(num_of_decks)
     ]
     return deck
+
+
+def playing_card(face: str, suit: str, value: int = 0) -> Card:
+    """The one shared card of a face, suit and value"""
+    key = (face, suit, value)
+    card = _CARDS.get(key)
+    if card is None:
+        card = _CARDS[key] = Card(
+            face=face,
+            suit=suit,
+            value=value,
+            id=card_id(face, suit),
+            front_img=card_img(face, suit),
+            back_img=BACK_IMG,
+        )
+    return card
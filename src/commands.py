@@ -0,0 +1,111 @@
+"""Player command grammar shared by the terminal game and the server
+
+    72      move the cards of column 7 onto column 2
+    P4      move the top card of the pile onto column 4
+    7       move the top card of column 7 to its foundation
+    p       move the top card of the pile to its foundation (klondike)
+    d       draw cards (klondike)
+    a       play every safe card up to the foundations
+    u r     undo, redo
+    h       hints
+    n q     new game, quit
+
+A move with several possible start cards takes the number of the wanted
+one after a space, `72 2`.
+"""
+from typing import NamedTuple
+
+from src.engine import AUTO, DRAW, Game, Move
+
+QUIT = "quit"
+NEW = "new"
+UNDO = "undo"
+REDO = "redo"
+DRAW_CARDS = "draw"
+AUTO_PLAY = "auto"
+HINT = "hint"
+FOUNDATION = "foundation"
+MOVE = "move"
+INVALID = "invalid"
+
+_KEYWORDS = {"q": QUIT, "n": NEW, "u": UNDO, "r": REDO, "h": HINT, "a": AUTO_PLAY}
+
+
+class Command(NamedTuple):
+    """Parsed player command, `choice` is 0 when no start card was picked"""
+
+    action: str
+    source: str = ""
+    target: str = ""
+    choice: int = 0
+
+
+def parse_command(text: str, variant: str) -> Command:
+    """Parse one line of player input
+
+    Args:
+        text (str): Command as typed
+        variant (str): 'klondike' or 'yukon', drawing only exists in klondike
+
+    Returns:
+        Command: The parsed command, action `INVALID` if it is not understood
+    """
+    words = text.strip().lower().split()
+    if not words or len(words) > 2:
+        return Command(INVALID)
+    command = words[0]
+    choice = 0
+    if len(words) == 2:
+        if not words[1].isdigit():
+            return Command(INVALID)
+        choice = int(words[1])
+
+    match command:
+        case command if command in _KEYWORDS:
+            return Command(_KEYWORDS[command])
+        case "d" if variant == "klondike":
+            return Command(DRAW_CARDS)
+        case "p" if variant == "klondike":
+            return Command(FOUNDATION, Game.PULL)
+        case command if command in Game.KINGS:
+            return Command(FOUNDATION, command)
+        case command if len(command) == 2:
+            return Command(MOVE, command[0].upper(), command[1].upper(), choice)
+        case _:
+            return Command(INVALID)
+
+
+def candidate_moves(game: Game, command: Command) -> list[Move]:
+    """Moves a move or foundation command can mean, one per start card"""
+    if command.action == DRAW_CARDS:
+        return [DRAW] if game.can_draw() else []
+    if command.action == AUTO_PLAY:
+        return [AUTO] if game.safe_moves() else []
+    source, target = command.source, command.target
+    if command.action == FOUNDATION:
+        stack = game.stacks.get(source)
+        if not stack:
+            return []
+        target = stack.cards[-1].suit
+    elif command.action != MOVE:
+        return []
+    return [Move(source, target, i) for i in game.move_options(source, target)]
+
+
+def auto_play_note(game: Game) -> str:
+    """Reminder that auto-play has safe cards to move, empty when it has none"""
+    safe = len(game.safe_moves())
+    if not safe:
+        return ""
+    return f" [a] plays {safe} safe card{'s' if safe > 1 else ''} up"
+
+
+def move_command(game: Game, move: Move) -> str:
+    """Command that plays `move`, with the start card number when there is a choice"""
+    if move == DRAW:
+        return "d"
+    command = f"{move.source}{move.target}"
+    options = game.move_options(move.source, move.target)
+    if len(options) > 1 and move.index in options:
+        command += f" {options.index(move.index) + 1}"
+    return command
@@ -0,0 +1,397 @@
+"""Streaming export of deal features for model training
+
+Walks a range of deal numbers in chunks, computes the features of each
+chunk with the vectorized dealing of `src.deals` and writes every chunk
+as one columnar shard, a directory of `.npy` files or, with `pyarrow`
+installed, a Parquet file. Chunks run in a pool of processes and only a
+few are in flight at a time, so memory stays flat however many deals are
+exported:
+
+    python -m src.dataset --variant yukon --count 100000000 --out yukon-features
+
+A `manifest.json` next to the shards lists the columns, their dtypes and
+the shards in deal order. `read_dataset` streams the shards back, `.npy`
+columns are memory mapped.
+
+Requires NumPy.
+"""
+import argparse
+import json
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from time import perf_counter
+from typing import Iterable, Iterator, NamedTuple
+
+import numpy as np
+
+from src.card_types import SUITS
+from src.deals import (
+    ACE,
+    DECK_SIZE,
+    RANKS,
+    Layouts,
+    buried_aces,
+    buried_kings,
+    classify,
+    deal_orders,
+    layout,
+    move_counts,
+)
+from src.engine import DRAW_COUNTS, Game
+from src.simulate import chunks, completed
+from src.solver import Verdict, solve
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet shards are optional, `.npy` shards need only NumPy
+    pyarrow = None
+
+FORMATS = ("npy", "parquet")
+MANIFEST = "manifest.json"
+# Deals per shard, the largest arrays of a yukon chunk stay around 50 MB
+CHUNK_SIZE = 262_144
+
+# Column name and dtype of every feature, in shard order
+FEATURES = {
+    "deal": np.uint64,
+    "screen": np.uint8,
+    "opening_moves": np.uint8,
+    "uncovering_moves": np.uint8,
+    "buried_aces": np.uint8,
+    "buried_kings": np.uint8,
+    **{f"ace_depth_{suit.lower()}": np.int8 for suit in SUITS},
+    "verdict": np.uint8,
+}
+
+# Solver verdict codes of the `verdict` column
+VERDICT_CODES = {Verdict.UNKNOWN: 0, Verdict.SOLVABLE: 1, Verdict.UNSOLVABLE: 2}
+
+
+class Shard(NamedTuple):
+    """One written chunk of the export"""
+
+    path: str
+    first_deal: int
+    rows: int
+
+
+def ace_depths(orders: np.ndarray, variant: str) -> np.ndarray:
+    """Cards lying on top of each ace in the dealt tableau
+
+    Args:
+        orders (np.ndarray): Card ids of every deal in deck order, see `deal_orders`
+        variant (str): 'klondike' or 'yukon'
+
+    Returns:
+        np.ndarray: Shape (deals, 4) in `SUITS` order, -1 for an ace in the stock
+    """
+    columns, _ = layout(variant)
+    above = np.full(DECK_SIZE, -1, dtype=np.int8)
+    for positions in columns:
+        for depth, position in enumerate(positions):
+            above[position] = len(positions) - depth - 1
+    # Deck position of every card, the inverse of each deal order
+    positions = np.empty_like(orders)
+    positions[np.arange(len(orders))[:, None], orders] = np.arange(
+        DECK_SIZE, dtype=orders.dtype
+    )
+    aces = [suit * RANKS + ACE for suit in range(len(SUITS))]
+    return above[positions[:, aces]]
+
+
+def solver_verdicts(
+    variant: str, deals: Iterable[int], max_nodes: int, draw: int = 3
+) -> np.ndarray:
+    """`VERDICT_CODES` of a search from every dealt position
+
+    Args:
+        variant (str): 'klondike' or 'yukon'
+        deals (Iterable[int]): Deal numbers
+        max_nodes (int): Positions to expand per deal before giving up
+        draw (int, optional): Cards turned per draw in klondike. Defaults to 3.
+
+    Returns:
+        np.ndarray: One uint8 code per deal
+    """
+    codes = []
+    game = None
+    for deal in deals:
+        if game is None:
+            game = Game.new(variant, deal, draw)
+        else:
+            game.reset(deal)
+        if game.is_lost():
+            verdict = Verdict.UNSOLVABLE
+        else:
+            verdict = solve(game, max_nodes).verdict
+        codes.append(VERDICT_CODES[verdict])
+    return np.array(codes, dtype=np.uint8)
+
+
+def deal_features(
+    variant: str, deals: range, max_nodes: int = 0, draw: int = 3
+) -> dict[str, np.ndarray]:
+    """Every column of `FEATURES` for a batch of deals
+
+    Everything but the solver verdict is computed for the whole batch at
+    once. The solver plays every deal through the engine and is by far
+    the slowest part, without a budget the verdicts are all unknown.
+
+    Args:
+        variant (str): 'klondike' or 'yukon'
+        deals (range): Deal numbers
+        max_nodes (int, optional): Solver budget per deal. Defaults to 0 (no search).
+        draw (int, optional): Cards turned per draw in klondike. Defaults to 3.
+
+    Returns:
+        dict[str, np.ndarray]: One array per column
+    """
+    numbers = np.arange(deals.start, deals.stop, deals.step, dtype=np.uint64)
+    orders = deal_orders(numbers)
+    layouts = Layouts(orders, variant)
+    moves, uncovering = move_counts(layouts)
+    features = {
+        "deal": numbers,
+        "screen": classify(moves, uncovering, variant),
+        "opening_moves": moves,
+        "uncovering_moves": uncovering,
+        "buried_aces": buried_aces(layouts),
+        "buried_kings": buried_kings(layouts),
+    }
+    depths = ace_depths(orders, variant)
+    for i, suit in enumerate(SUITS):
+        features[f"ace_depth_{suit.lower()}"] = depths[:, i]
+    if max_nodes:
+        features["verdict"] = solver_verdicts(variant, deals, max_nodes, draw)
+    else:
+        features["verdict"] = np.zeros(len(numbers), dtype=np.uint8)
+    return {name: features[name].astype(dtype) for name, dtype in FEATURES.items()}
+
+
+def iter_features(
+    variant: str,
+    deals: range,
+    chunk_size: int = CHUNK_SIZE,
+    max_nodes: int = 0,
+    draw: int = 3,
+) -> Iterator[dict[str, np.ndarray]]:
+    """`deal_features` of a deal range one chunk at a time, in this process
+
+    Args:
+        variant (str): 'klondike' or 'yukon'
+        deals (range): Deal numbers
+        chunk_size (int, optional): Deals per chunk. Defaults to CHUNK_SIZE.
+        max_nodes (int, optional): Solver budget per deal. Defaults to 0 (no search).
+        draw (int, optional): Cards turned per draw in klondike. Defaults to 3.
+
+    Yields:
+        dict[str, np.ndarray]: Columns of each chunk in deal order
+    """
+    for chunk in chunks(deals, chunk_size):
+        yield deal_features(variant, chunk, max_nodes, draw)
+
+
+def _shard_path(out: str, index: int, fmt: str) -> str:
+    name = f"part-{index:05d}"
+    return os.path.join(out, f"{name}.parquet" if fmt == "parquet" else name)
+
+
+def write_shard(path: str, features: dict[str, np.ndarray], fmt: str = "npy") -> None:
+    """Write the columns of one chunk, a half written shard is never left behind
+
+    Args:
+        path (str): Directory of `.npy` files or Parquet file to create
+        features (dict[str, np.ndarray]): Columns of the chunk
+        fmt (str, optional): One of `FORMATS`. Defaults to "npy".
+    """
+    tmp = path + ".tmp"
+    if fmt == "parquet":
+        table = pyarrow.table(features)
+        pyarrow.parquet.write_table(table, tmp)
+    else:
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name, column in features.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), column)
+    os.replace(tmp, path)
+
+
+def _export_chunk(
+    variant: str,
+    deals: range,
+    path: str,
+    fmt: str,
+    max_nodes: int,
+    draw: int,
+) -> Shard:
+    # Workers write their own shard, only its path travels back
+    write_shard(path, deal_features(variant, deals, max_nodes, draw), fmt)
+    return Shard(path, deals.start, len(deals))
+
+
+def _manifest(
+    variant: str, deals: range, chunk_size: int, fmt: str, max_nodes: int, draw: int
+) -> dict:
+    columns, hidden = layout(variant)
+    return {
+        "variant": variant,
+        "draw": draw,
+        "first_deal": deals.start,
+        "deals": len(deals),
+        "chunk_size": chunk_size,
+        "format": fmt,
+        "max_nodes": max_nodes,
+        "columns": {name: np.dtype(dtype).name for name, dtype in FEATURES.items()},
+        # The same for every deal of a variant, so kept here rather than per deal
+        "column_sizes": [len(positions) for positions in columns],
+        "face_down": hidden,
+        "verdict_codes": {
+            verdict.value: code for verdict, code in VERDICT_CODES.items()
+        },
+        "shards": [
+            os.path.basename(_shard_path("", index, fmt))
+            for index, _ in enumerate(chunks(deals, chunk_size))
+        ],
+    }
+
+
+def export(
+    variant: str,
+    deals: range,
+    out: str,
+    workers: int | None = None,
+    chunk_size: int = CHUNK_SIZE,
+    fmt: str = "npy",
+    max_nodes: int = 0,
+    draw: int = 3,
+) -> Iterator[Shard]:
+    """Write the features of every deal to shards across a pool of processes
+
+    Only a few chunks per worker are in flight at a time. Every shard
+    appears under its final name only once complete, so an interrupted
+    export run again with the same arguments skips the shards already
+    written.
+
+    Args:
+        variant (str): 'klondike' or 'yukon'
+        deals (range): Deal numbers, consecutive
+        out (str): Directory of the shards and the manifest
+        workers (int, optional): Worker processes. Defaults to None (one per core).
+        chunk_size (int, optional): Deals per shard. Defaults to CHUNK_SIZE.
+        fmt (str, optional): One of `FORMATS`. Defaults to "npy".
+        max_nodes (int, optional): Solver budget per deal. Defaults to 0 (no search).
+        draw (int, optional): Cards turned per draw in klondike. Defaults to 3.
+
+    Yields:
+        Shard: Every shard written, in no fixed order
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Invalid format, must be one of {FORMATS}")
+    if fmt == "parquet" and pyarrow is None:
+        raise ValueError("Parquet shards require pyarrow")
+    if deals.step != 1:
+        raise ValueError("Deal numbers must be consecutive")
+    workers = workers or os.cpu_count() or 1
+    manifest = _manifest(variant, deals, chunk_size, fmt, max_nodes, draw)
+    os.makedirs(out, exist_ok=True)
+    manifest_path = os.path.join(out, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            if json.load(file) != manifest:
+                raise ValueError(f"{out} holds an export with other settings")
+    else:
+        with open(manifest_path, "w") as file:
+            json.dump(manifest, file, indent=2)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for index, chunk in enumerate(chunks(deals, chunk_size)):
+            path = _shard_path(out, index, fmt)
+            if os.path.exists(path):
+                continue
+            pending.add(
+                executor.submit(
+                    _export_chunk, variant, chunk, path, fmt, max_nodes, draw
+                )
+            )
+            if len(pending) < workers * 2:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+        for future in completed(pending):
+            yield future.result()
+
+
+def read_dataset(out: str) -> Iterator[dict[str, np.ndarray]]:
+    """Columns of every shard of an export, in deal order
+
+    Args:
+        out (str): Directory written by `export`
+
+    Yields:
+        dict[str, np.ndarray]: One array per column, `.npy` columns are memory mapped
+    """
+    with open(os.path.join(out, MANIFEST)) as file:
+        manifest = json.load(file)
+    for name in manifest["shards"]:
+        path = os.path.join(out, name)
+        if manifest["format"] == "parquet":
+            table = pyarrow.parquet.read_table(path)
+            yield {column: table[column].to_numpy() for column in manifest["columns"]}
+        else:
+            yield {
+                column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r")
+                for column in manifest["columns"]
+            }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Export features of numbered deals")
+    parser.add_argument("--variant", choices=("klondike", "yukon"), default="yukon")
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--first-deal", type=int, default=0)
+    parser.add_argument("--out", required=True, help="directory of the shards")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--format", choices=FORMATS, default="npy")
+    parser.add_argument(
+        "--max-nodes",
+        type=int,
+        default=0,
+        help="solver budget per deal, 0 leaves the verdicts unknown",
+    )
+    parser.add_argument("--draw", type=int, choices=DRAW_COUNTS, default=3)
+    args = parser.parse_args(argv)
+
+    deals = range(args.first_deal, args.first_deal + args.count)
+    start = perf_counter()
+    written = 0
+    shards = 0
+    for shard in export(
+        args.variant,
+        deals,
+        args.out,
+        args.workers,
+        args.chunk_size,
+        args.format,
+        args.max_nodes,
+        args.draw,
+    ):
+        written += shard.rows
+        shards += 1
+    elapsed = perf_counter() - start
+    result = {
+        "variant": args.variant,
+        "deals": written,
+        "shards": shards,
+        "seconds": elapsed,
+        "deals_per_minute": written / elapsed * 60 if elapsed else 0.0,
+    }
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""Vectorized dealing and screening of numbered deals
+
+Deals the same cards as `Deck.shuffle` and `Game._init_tableau`, but for a
+whole batch of deal numbers at once with NumPy, so deals can be screened at
+millions per minute before any `Game` is built:
+
+    from src.deals import playable_deals
+
+    pool = list(playable_deals("yukon", 10_000))
+
+Requires NumPy.
+"""
+import argparse
+import json
+from time import perf_counter
+from typing import Iterator
+
+import numpy as np
+
+from src.deck import GOLDEN_GAMMA
+from src.engine import Game
+from src.solver import LOSS_CHECK_NODES, Verdict, solve
+from src.stack import EMPTY, TABLEAU_OK
+
+DECK_SIZE = 52
+COLUMNS = 7
+RANKS = 13
+ACE = 0
+KING = 12
+
+# Screening verdicts
+DEAD = 0
+RISKY = 1
+LIKELY = 2
+# Most opening moves a deal may have and still count as risky
+RISKY_MOVES = 6
+
+_TABLEAU_OK = np.frombuffer(b"".join(TABLEAU_OK), dtype=np.uint8).reshape(
+    EMPTY + 1, DECK_SIZE
+)
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def deal_orders(deals: np.ndarray, size: int = DECK_SIZE) -> np.ndarray:
+    """`deal_order` of every deal number of a batch
+
+    Args:
+        deals (np.ndarray): Deal numbers, any integer dtype
+        size (int, optional): Number of cards. Defaults to 52.
+
+    Returns:
+        np.ndarray: One row of card ids per deal, uint8, in deck order
+    """
+    deals = np.asarray(deals).astype(np.uint64)
+    orders = np.tile(np.arange(size, dtype=np.uint8), (len(deals), 1))
+    rows = np.arange(len(deals))
+    with np.errstate(over="ignore"):
+        for i in range(size - 1, 0, -1):
+            step = np.uint64(i * GOLDEN_GAMMA & (1 << 64) - 1)
+            j = (_splitmix64(deals + step) % np.uint64(i + 1)).astype(np.intp)
+            swapped = orders[rows, j]
+            orders[rows, j] = orders[:, i]
+            orders[:, i] = swapped
+    return orders
+
+
+def layout(variant: str) -> tuple[list[list[int]], list[int]]:
+    """Deck position of every tableau card and how many lie face down
+
+    Mirrors `Game._init_tableau`, cards are dealt from the end of the deck.
+    """
+    columns: list[list[int]] = [[] for _ in range(COLUMNS)]
+    position = DECK_SIZE
+    for i in range(COLUMNS):
+        position -= 1
+        columns[i].append(position)
+        for j in range(i + 1, COLUMNS):
+            position -= 1
+            columns[j].append(position)
+    if variant == "yukon":
+        for _ in range(4):
+            for i in range(1, COLUMNS):
+                position -= 1
+                columns[i].append(position)
+    # Column i holds i face down cards under its face up ones
+    return columns, list(range(COLUMNS))
+
+
+class Layouts:
+    """Tableau of a batch of deals as flat arrays
+
+    Attributes:
+        tops (np.ndarray): Top card id of every column, shape (deals, 7)
+        face_up (np.ndarray): Ids of all face up cards, shape (deals, face up cards)
+        face_up_column (np.ndarray): Column of each face up card
+        face_up_uncovers (np.ndarray): Moving the face up card turns a card over
+        hidden (np.ndarray): Ids of all face down cards, shape (deals, face down cards)
+        hidden_column (np.ndarray): Column of each face down card
+        hidden_above (np.ndarray): Cards lying on top of each face down card
+    """
+
+    def __init__(self, orders: np.ndarray, variant: str) -> None:
+        columns, hidden = layout(variant)
+        up_pos, up_col, up_uncovers = [], [], []
+        down_pos, down_col, down_above = [], [], []
+        for col, positions in enumerate(columns):
+            for depth, position in enumerate(positions):
+                if depth < hidden[col]:
+                    down_pos.append(position)
+                    down_col.append(col)
+                    down_above.append(len(positions) - depth - 1)
+                else:
+                    up_pos.append(position)
+                    up_col.append(col)
+                    up_uncovers.append(0 < depth == hidden[col])
+        self.tops: np.ndarray = orders[:, [positions[-1] for positions in columns]]
+        self.face_up: np.ndarray = orders[:, up_pos]
+        self.face_up_column: np.ndarray = np.array(up_col)
+        self.face_up_uncovers: np.ndarray = np.array(up_uncovers)
+        self.hidden: np.ndarray = orders[:, down_pos]
+        self.hidden_column: np.ndarray = np.array(down_col)
+        self.hidden_above: np.ndarray = np.array(down_above)
+
+
+def _opening_fits(layouts: Layouts) -> tuple[np.ndarray, np.ndarray]:
+    # Face up cards fitting on the top of another column, shape (deals, cards, 7),
+    # and aces on top of a column, shape (deals, cards)
+    fits = _TABLEAU_OK[layouts.tops[:, None, :], layouts.face_up[:, :, None]]
+    own = layouts.face_up_column[:, None] == np.arange(COLUMNS)[None, :]
+    tableau = fits.astype(bool) & ~own[None]
+    tops = layouts.tops[:, layouts.face_up_column] == layouts.face_up
+    aces = tops & (layouts.face_up % RANKS == ACE)
+    return tableau, aces
+
+
+def opening_moves(layouts: Layouts) -> np.ndarray:
+    """Number of legal moves of each dealt position, drawing aside
+
+    Counts face up cards that fit on the top of another column and aces on
+    top of a column, the only moves a fresh tableau without an empty
+    column has.
+    """
+    tableau, aces = _opening_fits(layouts)
+    return tableau.sum(axis=(1, 2)) + aces.sum(axis=1)
+
+
+def uncovering_moves(layouts: Layouts) -> np.ndarray:
+    """Number of opening moves that turn a face down card over"""
+    tableau, aces = _opening_fits(layouts)
+    moves = tableau.sum(axis=2) + aces
+    return (moves * layouts.face_up_uncovers).sum(axis=1)
+
+
+def buried_aces(layouts: Layouts) -> np.ndarray:
+    """Aces lying face down, weighted by the cards on top of them"""
+    aces = layouts.hidden % RANKS == ACE
+    return (aces * (layouts.hidden_above + 1)).sum(axis=1)
+
+
+def buried_kings(layouts: Layouts) -> np.ndarray:
+    """Kings lying face down on other cards, each needs an empty column"""
+    kings = layouts.hidden % RANKS == KING
+    on_cards = layouts.hidden_above < _column_sizes(layouts)[layouts.hidden_column] - 1
+    return (kings & on_cards[None]).sum(axis=1)
+
+
+def _column_sizes(layouts: Layouts) -> np.ndarray:
+    up = np.bincount(layouts.face_up_column, minlength=COLUMNS)
+    down = np.bincount(layouts.hidden_column, minlength=COLUMNS)
+    return up + down
+
+
+def screen(deals: np.ndarray, variant: str = "yukon") -> np.ndarray:
+    """Sort a batch of deals into `DEAD`, `RISKY` and `LIKELY`
+
+    A yukon deal without a single opening move is dead. A deal is risky
+    when none of its opening moves turns a card over and it has at most
+    `RISKY_MOVES` of them. On yukon deals 0-5999 the risky tenth of the
+    deals held 16 of the 23 that fail the game's own loss check, buried
+    aces and kings told the two apart no better than chance.
+
+    Args:
+        deals (np.ndarray): Deal numbers
+        variant (str, optional): 'klondike' or 'yukon'. Defaults to "yukon".
+
+    Returns:
+        np.ndarray: Screening verdict of every deal
+    """
+    layouts = Layouts(deal_orders(deals), variant)
+    return classify(*move_counts(layouts), variant)
+
+
+def move_counts(layouts: Layouts) -> tuple[np.ndarray, np.ndarray]:
+    """`opening_moves` and `uncovering_moves` from a single pass"""
+    tableau, aces = _opening_fits(layouts)
+    card_moves = tableau.sum(axis=2) + aces
+    moves = card_moves.sum(axis=1)
+    uncovering = (card_moves * layouts.face_up_uncovers).sum(axis=1)
+    return moves, uncovering
+
+
+def classify(moves: np.ndarray, uncovering: np.ndarray, variant: str) -> np.ndarray:
+    """Screening verdict of every deal from its opening move counts, see `screen`"""
+    risky = (uncovering == 0) & (moves <= RISKY_MOVES)
+    verdicts = np.where(risky, RISKY, LIKELY).astype(np.uint8)
+    if variant == "yukon":
+        # Klondike can still draw, a yukon deal without moves is over
+        verdicts[moves == 0] = DEAD
+    return verdicts
+
+
+def playable_deals(
+    variant: str = "yukon",
+    count: int = 1000,
+    first_deal: int = 0,
+    batch: int = 65_536,
+    max_nodes: int | None = LOSS_CHECK_NODES,
+) -> Iterator[int]:
+    """Deal numbers that pass screening
+
+    Risky deals go to the solver, which drops those it proves lost within
+    `max_nodes`, the same search the game runs to spot a lost position.
+    Without a budget risky deals are dropped unsolved, which keeps the
+    whole pipeline vectorized.
+
+    Args:
+        variant (str, optional): 'klondike' or 'yukon'. Defaults to "yukon".
+        count (int, optional): Deals to yield. Defaults to 1000.
+        first_deal (int, optional): First deal number to screen. Defaults to 0.
+        batch (int, optional): Deals screened per NumPy pass. Defaults to 65_536.
+        max_nodes (int, optional): Solver budget for risky deals. Defaults to LOSS_CHECK_NODES.
+
+    Yields:
+        int: Playable deal numbers in increasing order
+    """
+    start = first_deal
+    while count > 0:
+        deals = np.arange(start, start + batch, dtype=np.uint64)
+        verdicts = screen(deals, variant)
+        for deal, verdict in zip(deals.tolist(), verdicts.tolist()):
+            if verdict == DEAD:
+                continue
+            if verdict == RISKY:
+                if max_nodes is None:
+                    continue
+                game = Game.new(variant, deal)
+                if game.is_lost():
+                    continue
+                if solve(game, max_nodes).verdict == Verdict.UNSOLVABLE:
+                    continue
+            yield deal
+            count -= 1
+            if count == 0:
+                return
+        start += batch
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate a pool of playable deals")
+    parser.add_argument("--variant", choices=("klondike", "yukon"), default="yukon")
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--first-deal", type=int, default=0)
+    parser.add_argument(
+        "--no-solver", action="store_true", help="drop risky deals without solving"
+    )
+    parser.add_argument("--out", help="write the deal numbers to this file")
+    args = parser.parse_args(argv)
+
+    start = perf_counter()
+    pool = np.fromiter(
+        playable_deals(
+            args.variant,
+            args.count,
+            args.first_deal,
+            max_nodes=None if args.no_solver else LOSS_CHECK_NODES,
+        ),
+        dtype=np.uint64,
+        count=args.count,
+    )
+    elapsed = perf_counter() - start
+    if args.out:
+        np.savetxt(args.out, pool, fmt="%d")
+    screened = int(pool[-1]) - args.first_deal + 1 if len(pool) else 0
+    result = {
+        "variant": args.variant,
+        "deals": len(pool),
+        "screened": screened,
+        "seconds": elapsed,
+        "deals_per_minute": len(pool) / elapsed * 60 if elapsed else 0.0,
+    }
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,9 @@ import random
 from typing import Iterable
 from src.card import Card
 
+MASK64 = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+
 
 class EmptyDeck(Exception):
     """No more cards left in deck"""
@@ -10,12 +13,24 @@ class EmptyDeck(Exception):
 class Deck:
     """Deck object for card games"""
 
-    def __init__(self, cards: list[Card], num_of_decks: int = 1, shuffled=False):
+    def __init__(
+        self,
+        cards: list[Card],
+        num_of_decks: int = 1,
+        shuffled=False,
+        deal: int | None = None,
+    ):
         self.num_of_decks = num_of_decks
         self.cards: list[Card] = cards
-        if shuffled:
-            self.shuffle()
-        self.uid = hash((card.face + card.suit for card in self.cards))
+        self.deal: int | None = None
+        # A deal number alone asks for that deal
+        if shuffled or deal is not None:
+            self.shuffle(deal)
+        self.uid = (
+            self.deal
+            if self.deal is not None
+            else hash(tuple(card.face + card.suit for card in self.cards))
+        )
 
     def __len__(self) -> int:
         return len(self.cards)
@@ -48,12 +63,9 @@ class Deck:
     def __hash__(self) -> int:
         return hash(tuple(self.cards))
 
-    def deal_card(self, face_down: bool = False) -> Card:
+    def deal_card(self) -> Card:
         """Deal card from deck
 
-        Args:
-            face_down (bool, optional): Card is face down or face up. Defaults to False (face up).
-
         Raises:
             EmptyDeck: No cards left in deck
 
@@ -63,10 +75,46 @@ class Deck:
         if not self.cards:
             raise EmptyDeck("Deck is out of cards")
 
-        card = self.cards.pop()
-        card.face_down = face_down
-        return card
+        return self.cards.pop()
+
+    def shuffle(self, deal: int | None = None) -> None:
+        """Shuffle cards in deck into a numbered deal
 
-    def shuffle(self) -> None:
-        """Shuffle cards in deck"""
-        random.shuffle(self.cards)
+        The same deal number always gives the same order, so a deal can be
+        rebuilt from its number alone.
+
+        Args:
+            deal (int, optional): 64-bit deal number. Defaults to None (random deal).
+        """
+        if deal is None:
+            deal = random.getrandbits(64)
+        self.deal = deal & MASK64
+        self.cards.sort(key=lambda card: card.id)
+        self.cards = [self.cards[i] for i in deal_order(self.deal, len(self.cards))]
+
+
+def _splitmix64(x: int) -> int:
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9 & MASK64
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EB & MASK64
+    return x ^ (x >> 31)
+
+
+def deal_order(deal: int, size: int = 52) -> list[int]:
+    """Card order of a numbered deal
+
+    A Fisher-Yates shuffle driven by a counter based generator: draw `i` is
+    SplitMix64 of the deal number advanced `i` steps, so no generator
+    state has to be kept or stored.
+
+    Args:
+        deal (int): 64-bit deal number
+        size (int, optional): Number of cards. Defaults to 52.
+
+    Returns:
+        list[int]: Position in the sorted deck of each card of the deal
+    """
+    order = list(range(size))
+    for i in range(size - 1, 0, -1):
+        j = _splitmix64((deal + i * GOLDEN_GAMMA) & MASK64) % (i + 1)
+        order[i], order[j] = order[j], order[i]
+    return order
@@ -0,0 +1,628 @@
+from collections import Counter
+from hashlib import blake2b
+from typing import Iterator, NamedTuple
+
+from src import zobrist
+from src.card import Card
+from src.card_types import FACES, SUITS, card_id, get_playing_cards
+from src.deck import Deck
+from src.metrics import METRICS, timed
+from src.stack import EMPTY, RED_SUITS, TABLEAU_OK, Stack
+from src.state import State, canonical_form, decode_cards, encode_cards
+
+VARIANTS = ("klondike", "yukon")
+# Menu choice of every variant, the same in the terminal and over the network
+GAME_TYPES = {"1": "klondike", "2": "yukon"}
+# Cards turned from the stock per draw in klondike
+DRAW_COUNTS = (1, 3)
+
+# Cards that can be placed on a card in the tableau, indexed by card id
+_PLACEABLE_ON: list[tuple[int, ...]] = [
+    tuple(card for card, fits in enumerate(row) if fits) for row in TABLEAU_OK
+]
+
+
+class Move(NamedTuple):
+    """Move the cards of `source` from `index` onto `target`"""
+
+    source: str
+    target: str
+    index: int = -1
+
+
+# Drawing from the deck is the only move without a source stack
+DRAW = Move("", "P")
+# Every safe card up to the foundations at once, undone as one move
+AUTO = Move("", "A")
+
+
+class Delta(NamedTuple):
+    """Journal entry holding just enough to take a move back
+
+    For `DRAW` the count is the number of cards drawn and `recycled` tells
+    whether the waste was turned back into the deck first. `AUTO` keeps
+    the entry of every card it moved in `batch`.
+    """
+
+    move: Move
+    count: int
+    flipped: bool = False
+    recycled: bool = False
+    batch: tuple["Delta", ...] = ()
+
+
+class Game:
+    """Headless solitaire engine.
+
+    Holds the rules and the game state only, it never prints or reads stdin,
+    so it can be driven by bots as well as by the terminal interface.
+    """
+
+    ACES = ["S", "C", "D", "H"]
+    KINGS = ["1", "2", "3", "4", "5", "6", "7"]
+    PULL = "P"
+
+    def __init__(self, variant: str, deck: Deck, draw: int = 3) -> None:
+        _check_rules(variant, draw)
+        self.variant: str = variant
+        self.draw: int = draw
+        # The stock is kept with its next card last, so draws pop from the end
+        self.deck: Deck = deck
+        self.stacks: dict[str, Stack] = {}
+        for k in self.KINGS:
+            self.stacks[k] = Stack(k, "KING")
+        for a in self.ACES:
+            self.stacks[a] = Stack(a, "ACE")
+        self.stacks[self.PULL] = Stack(self.PULL, "PULL")
+        self.moves: int = 0
+        self._seen: Counter[int] = Counter()
+        self._deck_key: int = 0
+        self._deck_keys: list[int] = zobrist.table("DECK")
+        # The same position plays differently with another draw count
+        self._draw_key: int = zobrist.draw_key(draw) if variant == "klondike" else 0
+        self._journal: list[Delta] = []
+        self._redo: list[Move] = []
+        self._cards: list[Card] = [card for card in deck]
+        self._cards.sort(key=lambda card: card.id)
+        # Move index: the stack and position of every card outside the deck,
+        # and the cards each destination stack takes, cleared when it changes
+        self._where: list[str | None] = [None] * len(self._cards)
+        self._pos: list[int] = [0] * len(self._cards)
+        self._needs: dict[str, tuple[int, ...]] = {}
+        # Encoded stacks for `canonical_key`, each with the key it was encoded at
+        self._encoded: dict[str, tuple[int, bytes]] = {}
+        self._init_tableau()
+
+    @classmethod
+    def new(cls, variant: str, deal: int | None = None, draw: int = 3) -> "Game":
+        """Deal a new game
+
+        Args:
+            variant (str): 'klondike' or 'yukon'
+            deal (int, optional): 64-bit deal number. Defaults to None (random deal).
+            draw (int, optional): Cards turned per draw in klondike, 1 or 3. Defaults to 3.
+
+        Returns:
+            Game: Game ready to play
+        """
+        deck = Deck(
+            get_playing_cards(card_values=list(range(13))), shuffled=True, deal=deal
+        )
+        return cls(variant, deck, draw)
+
+    def reset(
+        self,
+        deal: int | None = None,
+        variant: str | None = None,
+        draw: int | None = None,
+    ) -> None:
+        """Deal a new game in place
+
+        The stacks, the deck and the shared cards of this game are reused,
+        so a long running process can play game after game without
+        building them again.
+
+        Args:
+            deal (int, optional): 64-bit deal number. Defaults to None (random deal).
+            variant (str, optional): 'klondike' or 'yukon'. Defaults to None (same variant).
+            draw (int, optional): Cards turned per draw in klondike, 1 or 3. Defaults to None (same count).
+        """
+        variant = variant or self.variant
+        draw = draw or self.draw
+        _check_rules(variant, draw)
+        self.variant = variant
+        self.draw = draw
+        self._draw_key = zobrist.draw_key(draw) if variant == "klondike" else 0
+        for stack in self.stacks.values():
+            stack.clear()
+        self.deck.cards = self._cards[:]
+        self.deck.shuffle(deal)
+        self.deck.uid = self.deck.deal
+        self.moves = 0
+        self._encoded.clear()
+        self._init_tableau()
+
+    @property
+    def deal(self) -> int | None:
+        """Number of the deal, `Game.new(variant, deal)` plays it again"""
+        return self.deck.deal
+
+    def __hash__(self) -> int:
+        return self.key
+
+    @property
+    def key(self) -> int:
+        """Zobrist key of the position, kept current move by move"""
+        if METRICS.enabled:
+            METRICS.count("hash")
+        key = self._deck_key ^ self._draw_key
+        for stack in self.stacks.values():
+            key ^= stack.key
+        return key
+
+    @property
+    def canonical_key(self) -> int:
+        """Key shared by all positions equal to this one up to symmetry
+
+        Positions with the tableau columns in another order, or with two
+        suits of one color traded while their foundations are equally high,
+        play the same, see `canonical_form`. The verdict cache of the
+        solver uses this key so one verdict answers each such family, its
+        transposition table stays on the cheaper `key`. The key is a digest
+        of the canonical form, the same in every process.
+        """
+        columns = [self._encode(self.stacks[k]) for k in self.KINGS]
+        foundations = bytes(len(self.stacks[suit]) for suit in SUITS)
+        piles = (self._encode(self.stacks[self.PULL]), self._encode_deck())
+        form = canonical_form(columns, foundations, piles)
+        digest = blake2b(form, digest_size=8).digest()
+        return int.from_bytes(digest, "big") ^ self._draw_key
+
+    def _encode(self, stack: Stack) -> bytes:
+        cached = self._encoded.get(stack.id)
+        if cached is None or cached[0] != stack.key:
+            cached = (stack.key, encode_cards(stack.cards, stack.hidden))
+            self._encoded[stack.id] = cached
+        return cached[1]
+
+    def _encode_deck(self) -> bytes:
+        cached = self._encoded.get("DECK")
+        if cached is None or cached[0] != self._deck_key:
+            cached = (self._deck_key, encode_cards(self.deck.cards))
+            self._encoded["DECK"] = cached
+        return cached[1]
+
+    def _rehash_deck(self) -> None:
+        # Cards are drawn from the end of the stock, so keying them by their
+        # index leaves the remaining keys untouched on a draw
+        self._deck_key = zobrist.stack_key(self._deck_keys, self.deck.cards)
+
+    def _init_tableau(self) -> None:
+        for i in range(1, 8):
+            card = self.deck.deal_card()
+            self.stacks[str(i)].add(card)
+
+            for j in range(i + 1, 8):
+                card = self.deck.deal_card()
+                self.stacks[str(j)].add(card, face_down=True)
+
+        if self.variant == "yukon":
+            for _ in range(4):
+                for i in range(2, 8):
+                    card = self.deck.deal_card()
+                    self.stacks[str(i)].add(card)
+
+        # The bottom card of the deck is turned first
+        self.deck.cards.reverse()
+        self._journal = []
+        self._redo = []
+        self._rehash_deck()
+        self._reindex()
+        self._seen = Counter([self.key])
+
+    def _reindex(self) -> None:
+        self._where = [None] * len(self._cards)
+        self._needs = {}
+        for stack in self.stacks.values():
+            self._place(stack, 0)
+
+    def _place(self, stack: Stack, start: int) -> None:
+        """Record where the cards of `stack` from `start` up now lie"""
+        self._needs.pop(stack.id, None)
+        for i in range(start, len(stack.cards)):
+            card = stack.cards[i]
+            self._where[card.id] = stack.id
+            self._pos[card.id] = i
+
+    def _unplace(self, cards: list[Card]) -> None:
+        for card in cards:
+            self._where[card.id] = None
+
+    def _needed_by(self, target: str) -> tuple[int, ...]:
+        """Ids of the cards that could be moved onto a destination stack"""
+        needs = self._needs.get(target)
+        if needs is None:
+            stack = self.stacks[target]
+            if stack.location == "ACE":
+                needs = (
+                    (card_id(FACES[len(stack)], target),) if len(stack) < 13 else ()
+                )
+            elif not stack:
+                needs = _PLACEABLE_ON[EMPTY]
+            elif stack.is_face_down():
+                needs = ()
+            else:
+                needs = _PLACEABLE_ON[stack.cards[-1].id]
+            self._needs[target] = needs
+        return needs
+
+    def snapshot(self) -> State:
+        """Compact copy of the current position"""
+        state = State(
+            tuple(
+                encode_cards(stack.cards, stack.hidden)
+                for stack in self.stacks.values()
+            ),
+            encode_cards(self.deck.cards),
+            self.moves,
+        )
+        if METRICS.enabled:
+            size = sum(map(len, state.stacks)) + len(state.deck)
+            METRICS.observe("snapshot_bytes", size)
+        return state
+
+    def restore(self, state: State) -> None:
+        """Return to a position taken with `snapshot`
+
+        The snapshot holds no history, the restored position starts with
+        nothing to undo or redo and only itself seen.
+        """
+        for stack, data in zip(self.stacks.values(), state.stacks):
+            stack.cards, stack.hidden = decode_cards(data, self._cards)
+            stack.rehash()
+        self.deck.cards, _ = decode_cards(state.deck, self._cards)
+        self._rehash_deck()
+        self._reindex()
+        self.moves = state.moves
+        self._journal.clear()
+        self._redo.clear()
+        self._seen = Counter([self.key])
+
+    def _pull_cards(self) -> Delta:
+        pull = self.stacks[self.PULL]
+        recycled = False
+        if not self.deck:
+            self.deck.cards = pull.cards[::-1]
+            self._unplace(pull.cards)
+            pull.clear()
+            self._rehash_deck()
+            recycled = True
+
+        stock = self.deck.cards
+        count = min(self.draw, len(stock))
+        drawn = stock[: -count - 1 : -1]
+        for depth in range(len(stock) - count, len(stock)):
+            self._deck_key ^= zobrist.card_key(self._deck_keys, depth, stock[depth])
+        del stock[-count:]
+        pull.add(*drawn)
+        self._place(pull, len(pull) - count)
+        return Delta(DRAW, count, recycled=recycled)
+
+    def _unpull_cards(self, delta: Delta) -> None:
+        pull = self.stacks[self.PULL]
+        cards = pull.pop(len(pull) - delta.count)
+        self._unplace(cards)
+        self._needs.pop(pull.id, None)
+        stock = self.deck.cards
+        stock.extend(reversed(cards))
+        for depth in range(len(stock) - len(cards), len(stock)):
+            self._deck_key ^= zobrist.card_key(self._deck_keys, depth, stock[depth])
+
+        if delta.recycled:
+            pull.add(*stock[::-1])
+            self._place(pull, 0)
+            self.deck.cards = []
+            self._deck_key = 0
+
+    def can_draw(self) -> bool:
+        return self.variant == "klondike" and bool(self.deck or self.stacks[self.PULL])
+
+    def move_options(self, source: str, target: str) -> list[int]:
+        """Start indexes in `source` that can be moved onto `target`
+
+        Args:
+            source (str): Id of the stack to move cards from
+            target (str): Id of the stack to move cards to
+
+        Returns:
+            list[int]: Valid start indexes, empty if there is no valid move
+        """
+        if source == target:
+            return []
+        if source not in self.stacks or target not in self.stacks:
+            return []
+        return self.stacks[target].valid_moves(self.stacks[source])
+
+    @timed("legal_moves_seconds")
+    def legal_moves(self) -> list[Move]:
+        """All moves that can be applied to the current position
+
+        Rather than trying every pair of stacks, each destination names the
+        cards it takes and the move index says where those cards are.
+        """
+        moves = []
+        for target in self.ACES + self.KINGS:
+            to_foundation = target in self.ACES
+            for needed in self._needed_by(target):
+                source = self._where[needed]
+                if source is None or source == target:
+                    continue
+                stack = self.stacks[source]
+                index = self._pos[needed]
+                top = index == len(stack) - 1
+                if stack.location == "KING":
+                    if index < stack.hidden or (to_foundation and not top):
+                        continue
+                    # A King already heading a column stays there
+                    if index == 0 and not to_foundation and not self.stacks[target]:
+                        continue
+                elif stack.location == "ACE":
+                    if to_foundation or not top or len(stack) <= 1:
+                        continue
+                elif not top:
+                    continue
+                moves.append(Move(source, target, index))
+        if self.can_draw():
+            moves.append(DRAW)
+        return moves
+
+    @timed("apply_seconds")
+    def apply(self, move: Move, keep_redo: bool = False) -> bool:
+        """Apply a move to the game, dropping the moves that could be redone
+
+        Args:
+            move (Move): Move to apply, `DRAW` to draw cards from the deck
+            keep_redo (bool, optional): Keep the moves that could be redone, for lookahead taken back with `unapply`. Defaults to False.
+
+        Returns:
+            bool: True if the move was legal and applied, False otherwise
+        """
+        if not self._push(move):
+            return False
+        if not keep_redo:
+            self._redo.clear()
+        return True
+
+    def unapply(self) -> Move | None:
+        """Take back the last move without keeping it for redo
+
+        Returns:
+            Move | None: The move taken back, None if there is nothing to undo
+        """
+        if not self._journal:
+            return None
+        delta = self._journal.pop()
+        self._take_back(delta)
+        return delta.move
+
+    def _take_back(self, delta: Delta) -> None:
+        if delta.batch:
+            for part in reversed(delta.batch):
+                self._take_back(part)
+            return
+        key = self.key
+        self._seen[key] -= 1
+        if not self._seen[key]:
+            # Searches apply and take back moves on the game, keep only real visits
+            del self._seen[key]
+
+        if delta.move == DRAW:
+            self._unpull_cards(delta)
+            return
+
+        to_stack: Stack = self.stacks[delta.move.target]
+        from_stack: Stack = self.stacks[delta.move.source]
+        if delta.flipped:
+            from_stack.flip()
+        from_stack.add(*to_stack.pop(len(to_stack) - delta.count))
+        self._needs.pop(to_stack.id, None)
+        self._place(from_stack, len(from_stack) - delta.count)
+        self.moves -= 1
+
+    def undo(self) -> bool:
+        """Take back the last move, it can be played again with `redo`"""
+        move = self.unapply()
+        if move is None:
+            return False
+        self._redo.append(move)
+        return True
+
+    def redo(self) -> bool:
+        """Play the last undone move again"""
+        if not self._redo:
+            return False
+        return self._push(self._redo.pop())
+
+    @property
+    def last_delta(self) -> Delta | None:
+        """Journal entry of the last move, None when there is nothing to undo"""
+        return self._journal[-1] if self._journal else None
+
+    @property
+    def history(self) -> list[Move]:
+        """Moves played to reach the current position"""
+        return [delta.move for delta in self._journal]
+
+    def _push(self, move: Move) -> bool:
+        if move == AUTO:
+            delta = self._auto_play()
+            if delta is None:
+                return False
+            self._journal.append(delta)
+            return True
+        if move == DRAW:
+            if not self.can_draw():
+                return False
+            self._journal.append(self._pull_cards())
+            self._seen[self.key] += 1
+            return True
+
+        if move.source not in self.stacks or move.target not in self.stacks:
+            return False
+        to_stack: Stack = self.stacks[move.target]
+        from_stack: Stack = self.stacks[move.source]
+        index = move.index if move.index >= 0 else len(from_stack) + move.index
+        if index not in self.move_options(move.source, move.target):
+            return False
+
+        flipped = 0 < index <= from_stack.hidden
+        self.moves += 1
+        cards = from_stack.pop(index)
+        to_stack.add(*cards)
+        self._needs.pop(from_stack.id, None)
+        self._place(to_stack, len(to_stack) - len(cards))
+        self._journal.append(
+            Delta(Move(move.source, move.target, index), len(cards), flipped)
+        )
+        self._seen[self.key] += 1
+        return True
+
+    def is_safe(self, card: Card) -> bool:
+        """Moving `card` up can never block another card
+
+        A card is safe once both foundations of the opposite color hold
+        every card that could be placed on it in the tableau.
+        """
+        rank = card.id % 13
+        if rank <= 1:
+            return True
+        opposite = ("S", "C") if card.suit in RED_SUITS else RED_SUITS
+        return all(len(self.stacks[suit]) >= rank for suit in opposite)
+
+    def safe_moves(self) -> list[Move]:
+        """Safe foundation moves that can be played right now"""
+        moves = []
+        for source in self.KINGS + [self.PULL]:
+            stack = self.stacks[source]
+            if not stack or stack.is_face_down():
+                continue
+            card = stack.cards[-1]
+            if len(self.stacks[card.suit]) == card.id % 13 and self.is_safe(card):
+                moves.append(Move(source, card.suit))
+        return moves
+
+    def auto_play(self) -> int:
+        """Play every safe card up to the foundations as a single move
+
+        Also finishes a won game at once, without animation.
+
+        Returns:
+            int: Number of cards moved
+        """
+        if not self.apply(AUTO):
+            return 0
+        return self._journal[-1].count
+
+    def _auto_play(self) -> Delta | None:
+        start = len(self._journal)
+        moves = self.safe_moves()
+        while moves:
+            # Each move has its own source and foundation, so all stay legal
+            for move in moves:
+                self._push(move)
+            moves = self.safe_moves()
+        if len(self._journal) == start:
+            return None
+        batch = tuple(self._journal[start:])
+        del self._journal[start:]
+        return Delta(AUTO, len(batch), batch=batch)
+
+    def seen(self, key: int | None = None) -> int:
+        """How often a position has been reached, the current one by default"""
+        return self._seen[self.key if key is None else key]
+
+    def is_won(self) -> bool:
+        """Every card is face up and in order, the rest plays out by itself"""
+        if self.deck or self.stacks[self.PULL]:
+            return False
+        for i in self.KINGS:
+            stack = self.stacks[i]
+            if not stack:
+                continue
+            if stack.hidden:
+                return False
+            for n, card in enumerate(stack.cards[1:], 1):
+                if not TABLEAU_OK[stack.cards[n - 1].id][card.id]:
+                    return False
+        return True
+
+    def is_lost(self) -> bool:
+        """No legal move is left
+
+        In klondike the game is lost when nothing but drawing is possible
+        and none of the cards a whole stock cycle turns up can be played.
+        Going back to a position seen before is no loss, the game may
+        still be won from it, proving that is left to the solver.
+        """
+        if self.variant == "klondike":
+            return self._stock_is_dead()
+        return not self.legal_moves()
+
+    def stock_cycle(self) -> list[Card]:
+        """Cards that come up on the waste while only drawing, in order
+
+        The rest of the current pass is followed by one full pass after the
+        waste is turned over, every later pass repeats that one.
+        """
+        stock = self.deck.cards[::-1]
+        cycle = pass_tops(stock, self.draw)
+        return cycle + pass_tops(self.stacks[self.PULL].cards + stock, self.draw)
+
+    def _stock_is_dead(self) -> bool:
+        if any(move != DRAW for move in self.legal_moves()):
+            return False
+        needed = set()
+        for target in self.ACES + self.KINGS:
+            needed.update(self._needed_by(target))
+        return not any(card.id in needed for card in self.stock_cycle())
+
+    def finish(self) -> Iterator[Move]:
+        """Move all tableau cards to the foundations of a won game
+
+        Yields:
+            Move: Each move right after it was applied
+        """
+        moved = True
+        while moved:
+            moved = False
+            for num in self.KINGS:
+                stack = self.stacks[num]
+                while stack:
+                    move = Move(num, stack.cards[-1].suit)
+                    if not self.apply(move):
+                        break
+                    moved = True
+                    yield move
+
+
+def _check_rules(variant: str, draw: int) -> None:
+    if variant not in VARIANTS:
+        raise ValueError(f"Invalid game variant, must be one of {VARIANTS}")
+    if draw not in DRAW_COUNTS:
+        raise ValueError(f"Invalid draw count, must be one of {DRAW_COUNTS}")
+
+
+def pass_tops(cards: list[Card], draw: int) -> list[Card]:
+    """Cards left on top of the waste by drawing through `cards` once
+
+    Args:
+        cards (list[Card]): Stock in drawing order
+        draw (int): Cards turned per draw
+
+    Returns:
+        list[Card]: The playable card after each draw
+    """
+    tops = cards[draw - 1 :: draw]
+    if len(cards) % draw:
+        tops.append(cards[-1])
+    return tops
@@ -0,0 +1,156 @@
+"""Moves ranked by their chance to win, found within a time budget
+
+The ranking is anytime, each stage refines the one before and the best
+ranking so far is returned when the budget runs out:
+
+1. every legal move is scored by `win_chance` of the position it reaches,
+2. a move's score becomes the best score among the moves that follow it,
+3. the solver searches after each move, best ranked first, with node
+   budgets growing every round. A proven win or loss replaces the estimate.
+
+    hints = rank_hints(game, budget=0.05)
+    print(hints[0].command, f"{hints[0].win_chance:.0%}")
+"""
+from math import exp
+from time import perf_counter
+from typing import TYPE_CHECKING, NamedTuple
+
+from src.commands import move_command
+from src.engine import Game, Move
+from src.solver import Verdict, distinct_moves, move_priority, solve
+
+if TYPE_CHECKING:
+    from src.cache import VerdictCache
+
+# Seconds a hint may take in the terminal game and the server
+HINT_BUDGET = 0.05
+# Solver nodes per move in the first proving round, four times more each round
+FIRST_PROOF_NODES = 64
+# Share of the budget spent searching, the rest covers taking a deep solver
+# line back once the search stops
+SEARCH_SHARE = 0.9
+
+# Logistic weights of bias, foundation cards, face down cards, empty columns
+# and stock cards, each as a share of its most. Fitted on the positions of
+# greedy self-play of deals 0-999, so the chance is that of the simulator's
+# greedy policy going on to win, a floor for a careful player.
+_WEIGHTS: dict[str, tuple[float, ...]] = {
+    "klondike": (-2.29, 6.76, -3.30, -1.06, 2.99),
+    "yukon": (0.83, -0.26, -3.02, 1.73, 0.0),
+}
+
+
+class Hint(NamedTuple):
+    """A ranked move, `proven` when the solver settled its chance"""
+
+    move: Move
+    command: str
+    win_chance: float
+    proven: bool = False
+
+
+def win_chance(game: Game) -> float:
+    """Estimated chance to win the position, without searching"""
+    if game.is_won():
+        return 1.0
+    bias, foundation, face_down, empty, stock = _WEIGHTS[game.variant]
+    columns = [game.stacks[k] for k in game.KINGS]
+    founded = sum(len(game.stacks[a]) for a in game.ACES)
+    hidden = sum(stack.hidden for stack in columns)
+    free = sum(not stack for stack in columns)
+    left = len(game.deck) + len(game.stacks[game.PULL])
+    score = (
+        bias
+        + foundation * founded / 52
+        + face_down * hidden / 21
+        + empty * free / 7
+        + stock * left / 24
+    )
+    return 1 / (1 + exp(-score))
+
+
+def rank_hints(
+    game: Game,
+    budget: float = HINT_BUDGET,
+    cache: "VerdictCache | None" = None,
+) -> list[Hint]:
+    """Legal moves, the most likely to win first
+
+    The game is searched in place and left as it was, redo included.
+
+    Args:
+        game (Game): Position to give hints for
+        budget (float, optional): Seconds to search. Defaults to HINT_BUDGET.
+        cache (VerdictCache, optional): Verdicts shared with the loss check. Defaults to None.
+
+    Returns:
+        list[Hint]: Every distinct legal move, ranked
+    """
+    deadline = perf_counter() + budget * SEARCH_SHARE
+    moves = distinct_moves(game, game.legal_moves())
+    moves.sort(key=lambda move: move_priority(game, move))
+    chances: dict[Move, float] = {}
+    proven: set[Move] = set()
+
+    for move in moves:
+        game.apply(move, keep_redo=True)
+        chances[move] = win_chance(game)
+        game.unapply()
+
+    for move in _ranked(moves, chances):
+        if perf_counter() >= deadline:
+            break
+        game.apply(move, keep_redo=True)
+        if game.is_won():
+            proven.add(move)
+        else:
+            follow = []
+            for reply in game.legal_moves():
+                game.apply(reply, keep_redo=True)
+                follow.append(win_chance(game))
+                game.unapply()
+            chances[move] = max(follow, default=chances[move])
+        game.unapply()
+
+    nodes = FIRST_PROOF_NODES
+    # A proven win is the best hint there is, searching on cannot change it
+    while perf_counter() < deadline and not _proven_win(chances, proven):
+        if len(proven) == len(moves):
+            break
+        for move in _ranked(moves, chances):
+            if move in proven:
+                continue
+            if perf_counter() >= deadline:
+                break
+            game.apply(move, keep_redo=True)
+            solution = solve(game, nodes, cache, deadline)
+            game.unapply()
+            if solution.verdict != Verdict.UNKNOWN:
+                chances[move] = float(solution.verdict == Verdict.SOLVABLE)
+                proven.add(move)
+                if solution.verdict == Verdict.SOLVABLE:
+                    break
+        nodes *= 4
+
+    return [
+        Hint(move, move_command(game, move), chances[move], move in proven)
+        for move in _ranked(moves, chances)
+    ]
+
+
+def format_hint(hint: Hint) -> str:
+    """Chance then command, `*` marks a chance the solver proved
+
+    The command comes last as it may hold a space, `  63%  72 2`.
+    """
+    proof = "*" if hint.proven else " "
+    return f"{hint.win_chance:>4.0%}{proof} {hint.command}"
+
+
+def _proven_win(chances: dict[Move, float], proven: set[Move]) -> bool:
+    return any(chances[move] == 1.0 for move in proven)
+
+
+def _ranked(moves: list[Move], chances: dict[Move, float]) -> list[Move]:
+    # Stable, so equal chances keep the solver's move order
+    return sorted(moves, key=lambda move: -chances[move])
@@ -0,0 +1,196 @@
+import json
+import os
+import sys
+import threading
+from functools import wraps
+from time import perf_counter
+from typing import Callable, TypeVar
+
+F = TypeVar("F", bound=Callable)
+
+
+class Summary:
+    """Count, sum and maximum of observed values"""
+
+    __slots__ = ("count", "total", "maximum")
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.total: float = 0.0
+        self.maximum: float = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value > self.maximum:
+            self.maximum = value
+
+    def as_dict(self) -> dict:
+        mean = self.total / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": mean,
+            "max": self.maximum,
+        }
+
+
+class Metrics:
+    """Counters and timings of the hot paths
+
+    Off by default. Instrumented code checks `enabled` before doing any
+    work, so leaving it off costs a single attribute lookup per call.
+    Functions marked with `timed` are only wrapped while enabled.
+    """
+
+    def __init__(self) -> None:
+        self.enabled: bool = False
+        self.counters: dict[str, int] = {}
+        self.summaries: dict[str, Summary] = {}
+        self._lock = threading.Lock()
+        self._dumper: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def enable(self) -> None:
+        self.enabled = True
+        _instrument(self)
+
+    def disable(self) -> None:
+        self.enabled = False
+        _instrument(None)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters = {}
+            self.summaries = {}
+
+    def count(self, name: str, amount: int = 1) -> None:
+        # The dump thread reads the dicts, they only change under the lock
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            summary = self.summaries.get(name)
+            if summary is None:
+                summary = self.summaries[name] = Summary()
+            summary.add(value)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "summaries": {
+                    name: summary.as_dict()
+                    for name, summary in self.summaries.items()
+                },
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.as_dict(), indent=2)
+
+    def to_prometheus(self, prefix: str = "solitaire") -> str:
+        """Metrics in the Prometheus text exposition format"""
+        data = self.as_dict()
+        lines = []
+        for name, value in sorted(data["counters"].items()):
+            metric = _metric_name(prefix, name) + "_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for name, summary in sorted(data["summaries"].items()):
+            metric = _metric_name(prefix, name)
+            lines.append(f"# TYPE {metric} summary")
+            lines.append(f"{metric}_count {summary['count']}")
+            lines.append(f"{metric}_sum {summary['sum']}")
+            lines.append(f"# TYPE {metric}_max gauge")
+            lines.append(f"{metric}_max {summary['max']}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str, fmt: str = "json") -> None:
+        """Write the metrics to `path`, replacing the previous dump atomically
+
+        Args:
+            path (str): File to write
+            fmt (str, optional): 'json' or 'prometheus'. Defaults to "json".
+        """
+        text = self.to_prometheus() if fmt == "prometheus" else self.to_json()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as out:
+            out.write(text)
+        os.replace(tmp_path, path)
+
+    def start_dump(self, path: str, interval: float = 10.0, fmt: str = "json") -> None:
+        """Enable metrics and dump them to `path` every `interval` seconds"""
+        self.stop_dump()
+        self.enable()
+        self._stop.clear()
+
+        def loop() -> None:
+            while not self._stop.wait(interval):
+                self.dump(path, fmt)
+            self.dump(path, fmt)
+
+        self._dumper = threading.Thread(target=loop, name="metrics-dump", daemon=True)
+        self._dumper.start()
+
+    def stop_dump(self) -> None:
+        """Stop the periodic dump after writing one last time"""
+        if self._dumper is not None:
+            self._stop.set()
+            self._dumper.join()
+            self._dumper = None
+
+
+def _metric_name(prefix: str, name: str) -> str:
+    return f"{prefix}_{name}".replace(".", "_").replace("-", "_")
+
+
+METRICS = Metrics()
+
+
+# Every function marked with `timed` and the name it is timed under
+_timed: list[tuple[Callable, str]] = []
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """Time the calls of a function into `METRICS` while it is enabled
+
+    The function is returned unchanged, `Metrics.enable` swaps a timing
+    wrapper in on its class or module and `disable` puts it back, so
+    metrics that are off cost nothing per call. Calls through a reference
+    taken before the swap are not timed.
+    """
+
+    def decorate(func: F) -> F:
+        _timed.append((func, name))
+        if METRICS.enabled:
+            # Defined after metrics were turned on, too late for the swap
+            return _timing(func, name, METRICS)  # type: ignore[return-value]
+        return func
+
+    return decorate
+
+
+def _instrument(metrics: Metrics | None) -> None:
+    # Wrap every timed function to observe into `metrics`, or unwrap them all
+    for func, name in _timed:
+        owner = sys.modules[func.__module__]
+        *path, attr = func.__qualname__.split(".")
+        for part in path:
+            owner = getattr(owner, part)
+        if metrics is None:
+            setattr(owner, attr, func)
+        elif getattr(owner, attr) is func:
+            setattr(owner, attr, _timing(func, name, metrics))
+
+
+def _timing(func: Callable, name: str, metrics: Metrics) -> Callable:
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.observe(name, perf_counter() - start)
+
+    return wrapper
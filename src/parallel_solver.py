@@ -0,0 +1,265 @@
+import argparse
+import ctypes
+import json
+import multiprocessing as mp
+import os
+from queue import Empty
+from time import perf_counter
+
+from src.engine import DRAW_COUNTS, VARIANTS, Game, Move
+from src.solver import Solution, Verdict, ordered_moves
+
+# Probes into the shared table before a position is searched without storing it
+PROBES = 8
+# Nodes a worker searches between checks for idle workers and the budget
+CHECK_EVERY = 256
+
+
+class SharedTable:
+    """Lock free set of position keys in shared memory
+
+    An open addressing table of 64-bit keys, zero marks a free slot. Two
+    workers racing for the same slot can both believe they claimed a
+    position, which only costs some duplicate search, never a wrong verdict.
+    """
+
+    def __init__(self, bits: int, ctx=mp) -> None:
+        self.mask: int = (1 << bits) - 1
+        self.slots = ctx.Array(ctypes.c_uint64, 1 << bits, lock=False)
+
+    def claim(self, key: int) -> bool:
+        """Record a position, False if some worker already has it"""
+        key = key or 1
+        slots = self.slots
+        for probe in range(PROBES):
+            index = (key + probe) & self.mask
+            slot = slots[index]
+            if slot == key:
+                return False
+            if slot == 0:
+                slots[index] = key
+                return True
+        # Table is full here, search the position without remembering it
+        return True
+
+
+def solve_parallel(
+    game: Game,
+    max_nodes: int = 2_000_000,
+    workers: int | None = None,
+    table_bits: int = 22,
+) -> Solution:
+    """Search one position with several processes
+
+    The root moves become the first tasks of a shared queue. Every worker
+    runs the same depth first search as `solve` with the same move
+    ordering, sharing one transposition table. A worker that notices idle
+    workers hands over the untried moves of its shallowest open level as
+    new tasks, so a lopsided tree keeps every process busy.
+
+    When both searches finish within their budgets the verdict is the same
+    as `solve`, the winning line may differ.
+
+    Args:
+        game (Game): Game to solve
+        max_nodes (int, optional): Positions to expand over all workers. Defaults to 2_000_000.
+        workers (int, optional): Worker processes. Defaults to None (one per core).
+        table_bits (int, optional): log2 of the shared table size. Defaults to 22.
+
+    Returns:
+        Solution: The verdict with the winning line and the number of expanded positions
+    """
+    if game.is_won():
+        return Solution(Verdict.SOLVABLE, [], 0)
+    ctx = mp.get_context()
+    table = SharedTable(table_bits, ctx)
+    table.claim(game.key)
+    tasks = ctx.Queue()
+    results = ctx.Queue()
+    nodes = ctx.Value(ctypes.c_int64, 0)
+    pending = ctx.Value(ctypes.c_int64, 0)
+    idle = ctx.Value(ctypes.c_int64, 0)
+    found = ctx.Value(ctypes.c_int64, 0)
+    stop = ctx.Event()
+
+    root_moves = ordered_moves(game)
+    with pending.get_lock():
+        pending.value = len(root_moves)
+    for move in root_moves:
+        tasks.put([move])
+
+    # Workers restore the position itself, a restored game has no history
+    # that would lead back to it from the deal
+    base = (game.variant, game.draw, game.snapshot())
+    shared = (table, tasks, results, nodes, pending, idle, found, stop)
+    processes = [
+        ctx.Process(target=_worker, args=(base, shared, max_nodes), daemon=True)
+        for _ in range(workers or os.cpu_count() or 1)
+    ]
+    for process in processes:
+        process.start()
+
+    verdict = Verdict.UNSOLVABLE
+    line: list[Move] = []
+    try:
+        while True:
+            try:
+                line = results.get(timeout=0.01)
+                verdict = Verdict.SOLVABLE
+                break
+            except Empty:
+                pass
+            if found.value:
+                line = results.get()
+                verdict = Verdict.SOLVABLE
+                break
+            if nodes.value >= max_nodes:
+                verdict = Verdict.UNKNOWN
+                break
+            if pending.value == 0:
+                if found.value:
+                    continue
+                break
+    finally:
+        stop.set()
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    return Solution(verdict, line, nodes.value)
+
+
+def _worker(base: tuple, shared: tuple, max_nodes: int) -> None:
+    variant, draw, state = base
+    table, tasks, results, nodes, pending, idle, found, stop = shared
+    game = Game.new(variant, draw=draw)
+    game.restore(state)
+
+    while not stop.is_set():
+        with idle.get_lock():
+            idle.value += 1
+        try:
+            prefix = tasks.get(timeout=0.01)
+        except Empty:
+            continue
+        finally:
+            with idle.get_lock():
+                idle.value -= 1
+
+        line = _search(game, prefix, shared, max_nodes)
+        if line is not None:
+            with found.get_lock():
+                found.value = 1
+            results.put(line)
+            stop.set()
+        with pending.get_lock():
+            pending.value -= 1
+
+
+def _search(
+    game: Game, prefix: list[Move], shared: tuple, max_nodes: int
+) -> list[Move] | None:
+    """Search the subtree below `prefix`, returning a winning line if found"""
+    table, tasks, results, nodes, pending, idle, found, stop = shared
+    for move in prefix:
+        game.apply(move)
+
+    path: list[Move] = []
+    on_path = [game.key]
+    line = None
+    # Untried moves of every open level, best move last
+    frontier: list[list[Move]] = []
+    count = 0
+
+    if not table.claim(game.key):
+        frontier = []
+    elif game.is_won():
+        line = prefix[:]
+    else:
+        frontier = [ordered_moves(game)[::-1]]
+
+    while frontier and line is None:
+        level = frontier[-1]
+        if not level:
+            frontier.pop()
+            if path:
+                path.pop()
+                on_path.pop()
+                game.unapply()
+            continue
+
+        move = level.pop()
+        game.apply(move)
+        key = game.key
+        if key in on_path or not table.claim(key):
+            game.unapply()
+            continue
+        path.append(move)
+        on_path.append(key)
+
+        if game.is_won():
+            line = prefix + path
+            break
+
+        count += 1
+        if count == CHECK_EVERY:
+            with nodes.get_lock():
+                nodes.value += count
+            count = 0
+            if stop.is_set() or nodes.value >= max_nodes:
+                break
+            if idle.value > 0:
+                _donate(prefix, path, frontier, tasks, pending)
+        frontier.append(ordered_moves(game)[::-1])
+
+    with nodes.get_lock():
+        nodes.value += count
+    for _ in range(len(path) + len(prefix)):
+        game.unapply()
+    return line
+
+
+def _donate(
+    prefix: list[Move], path: list[Move], frontier: list[list[Move]], tasks, pending
+) -> None:
+    """Hand the untried moves of the shallowest open level to idle workers"""
+    for depth, level in enumerate(frontier):
+        if level:
+            with pending.get_lock():
+                pending.value += len(level)
+            for move in reversed(level):
+                tasks.put(prefix + path[:depth] + [move])
+            level.clear()
+            return
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Solve one deal with several processes"
+    )
+    parser.add_argument("deal", type=int)
+    parser.add_argument("--variant", choices=VARIANTS, default="klondike")
+    parser.add_argument("--draw", type=int, choices=DRAW_COUNTS, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-nodes", type=int, default=2_000_000)
+    args = parser.parse_args(argv)
+
+    start = perf_counter()
+    solution = solve_parallel(
+        Game.new(args.variant, args.deal, args.draw), args.max_nodes, args.workers
+    )
+    result = {
+        "deal": args.deal,
+        "variant": args.variant,
+        "draw": args.draw,
+        "verdict": solution.verdict.value,
+        "moves": len(solution.moves),
+        "nodes": solution.nodes,
+        "seconds": perf_counter() - start,
+    }
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""Compact binary game records
+
+A record file starts with `MAGIC` and holds one record per game:
+
+    GAME  draw:u4 variant:u4  deal:u64  token...  END
+
+Every move is one byte, the source stack code in the high nibble and the
+target in the low one. A move of more than one card is preceded by
+`INDEX` and its start index, a draw is `DRAW_BYTE`, and auto-play, undo
+and redo get a byte each. Games are appended as they are played, and the offset of
+every game goes to a side file of little endian u64s (`<path>.idx`) so
+any game can be found without reading the ones before it.
+
+A process killed mid game leaves a record without `END`. Readers stop a
+game at the next indexed offset or the next `GAME` byte, which no move
+byte can hold, and hand back the moves it got to.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_right
+from typing import Iterator, NamedTuple
+
+from src.engine import AUTO, DRAW, VARIANTS, Delta, Game, Move
+
+MAGIC = b"PSRC\x01"
+GAME = 0xFE
+END = 0xFF
+INDEX = 0xF0
+UNDO = 0xC0
+REDO = 0xC1
+AUTO_BYTE = 0xC2
+
+STACK_CODES = Game.KINGS + Game.ACES + [Game.PULL]
+_CODE = {stack: code for code, stack in enumerate(STACK_CODES)}
+DRAW_BYTE = _CODE[Game.PULL] << 4 | _CODE[Game.PULL]
+
+_HEADER = struct.Struct("<BBQ")
+_OFFSET = struct.Struct("<Q")
+
+Token = Move | str
+
+
+class GameRecord(NamedTuple):
+    variant: str
+    deal: int
+    tokens: bytes
+    draw: int = 3
+
+    def moves(self) -> Iterator[Token]:
+        return decode(self.tokens)
+
+
+def encode(delta: Delta) -> bytes:
+    """Bytes of one applied move, taken from its journal entry"""
+    move = delta.move
+    if move == DRAW:
+        return bytes((DRAW_BYTE,))
+    if move == AUTO:
+        return bytes((AUTO_BYTE,))
+    code = _CODE[move.source] << 4 | _CODE[move.target]
+    if delta.count > 1:
+        return bytes((INDEX, move.index, code))
+    return bytes((code,))
+
+
+def decode(tokens: bytes) -> Iterator[Token]:
+    """Moves of a record, "undo" and "redo" for those commands
+
+    A single card move has no recorded index, it comes back with index -1
+    which `Game.apply` reads as the top card.
+    """
+    i = 0
+    while i < len(tokens):
+        byte = tokens[i]
+        i += 1
+        if byte == UNDO:
+            yield "undo"
+        elif byte == REDO:
+            yield "redo"
+        elif byte == DRAW_BYTE:
+            yield DRAW
+        elif byte == AUTO_BYTE:
+            yield AUTO
+        elif byte == INDEX:
+            index, code = tokens[i], tokens[i + 1]
+            i += 2
+            yield Move(STACK_CODES[code >> 4], STACK_CODES[code & 0xF], index)
+        else:
+            yield Move(STACK_CODES[byte >> 4], STACK_CODES[byte & 0xF])
+
+
+class Recorder:
+    """Appends games to a record file while they are played"""
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self._data = open(path, "ab")
+        self._index = open(f"{path}.idx", "ab")
+        if self._data.tell() == 0:
+            self._data.write(MAGIC)
+        self._playing = False
+
+    def start(self, game: Game) -> None:
+        """Begin the record of a new game"""
+        if self._playing:
+            self.end()
+        offset = self._data.tell()
+        kind = game.draw << 4 | VARIANTS.index(game.variant)
+        self._data.write(_HEADER.pack(GAME, kind, game.deal))
+        # The header reaches the file before the index points at it
+        self._data.flush()
+        self._index.write(_OFFSET.pack(offset))
+        self._index.flush()
+        self._playing = True
+
+    def move(self, delta: Delta) -> None:
+        self._data.write(encode(delta))
+
+    def undo(self) -> None:
+        self._data.write(bytes((UNDO,)))
+
+    def redo(self) -> None:
+        self._data.write(bytes((REDO,)))
+
+    def end(self) -> None:
+        """Close the record of the current game and flush it to disk"""
+        if self._playing:
+            self._data.write(bytes((END,)))
+            self._playing = False
+        self._data.flush()
+        self._index.flush()
+
+    def close(self) -> None:
+        self.end()
+        self._data.close()
+        self._index.close()
+
+
+def _parse_game(
+    data: bytes | mmap.mmap, offset: int, limit: int | None = None
+) -> tuple[GameRecord, int]:
+    # `limit` is where the next game starts, if known
+    limit = len(data) if limit is None else min(limit, len(data))
+    if offset + _HEADER.size > limit:
+        raise ValueError(f"Game record at offset {offset} is cut short")
+    marker, kind, deal = _HEADER.unpack_from(data, offset)
+    if marker != GAME:
+        raise ValueError(f"No game record at offset {offset}")
+    start = i = offset + _HEADER.size
+    # Scan to the end marker, a game left unfinished stops at the next one
+    while i < limit and data[i] not in (END, GAME):
+        step = 3 if data[i] == INDEX else 1
+        if i + step > limit:
+            # A multi card move cut off by a kill
+            break
+        i += step
+    if i < limit and data[i] == END:
+        end = i + 1
+    elif i < limit and data[i] == GAME:
+        end = i
+    else:
+        end = limit
+    # Records written before the draw count was stored all drew three
+    draw = kind >> 4 or 3
+    record = GameRecord(VARIANTS[kind & 0xF], deal, bytes(data[start:i]), draw)
+    return record, end
+
+
+def _read_offsets(path: str) -> list[int]:
+    try:
+        with open(f"{path}.idx", "rb") as index:
+            raw = index.read()
+    except FileNotFoundError:
+        return []
+    whole = len(raw) - len(raw) % _OFFSET.size
+    return sorted(offset for (offset,) in _OFFSET.iter_unpack(raw[:whole]))
+
+
+def _next_offset(offsets: list[int], offset: int, size: int) -> int:
+    after = bisect_right(offsets, offset)
+    return min(offsets[after], size) if after < len(offsets) else size
+
+
+def read_games(path: str) -> Iterator[GameRecord]:
+    """Stream every game of a record file in order
+
+    A game cut short by a killed process comes back with the moves that
+    reached the file, bytes that start no game are skipped.
+    """
+    offsets = _read_offsets(path)
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size <= len(MAGIC):
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[: len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a game record file")
+            offset = len(MAGIC)
+            while offset < len(data):
+                limit = _next_offset(offsets, offset, len(data))
+                if data[offset] != GAME or offset + _HEADER.size > limit:
+                    offset = limit
+                    continue
+                record, offset = _parse_game(data, offset, limit)
+                yield record
+
+
+def game_at(path: str, number: int) -> GameRecord:
+    """Game `number` of a record file, found through its index"""
+    with open(f"{path}.idx", "rb") as index:
+        index.seek(number * _OFFSET.size)
+        raw = index.read(_OFFSET.size)
+    if len(raw) < _OFFSET.size:
+        raise IndexError("game number out of range")
+    (offset,) = _OFFSET.unpack(raw)
+    limit = _next_offset(_read_offsets(path), offset, 1 << 64)
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            record, _ = _parse_game(data, offset, limit)
+    return record
+
+
+def move_at(path: str, number: int, move: int) -> Token:
+    """Move `move` of game `number` without replaying anything"""
+    for n, token in enumerate(game_at(path, number).moves()):
+        if n == move:
+            return token
+    raise IndexError("move number out of range")
+
+
+def replay(record: GameRecord) -> Game:
+    """Play a recorded game headlessly and return its final position"""
+    game = Game.new(record.variant, record.deal, record.draw)
+    for token in record.moves():
+        if token == "undo":
+            game.undo()
+        elif token == "redo":
+            game.redo()
+        elif not game.apply(token):  # type: ignore[arg-type]
+            raise ValueError(f"Recorded move {token} is not legal")
+    return game
+
+
+def replay_file(path: str) -> Iterator[tuple[GameRecord, Game]]:
+    """Stream every game of a record file with its replayed final position"""
+    for record in read_games(path):
+        yield record, replay(record)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay a game record file")
+    parser.add_argument("path")
+    args = parser.parse_args(argv)
+
+    games = wins = tokens = 0
+    for record, game in replay_file(args.path):
+        games += 1
+        wins += game.is_won()
+        tokens += len(record.tokens)
+    print(json.dumps({"games": games, "wins": wins, "token_bytes": tokens}))
+
+
+if __name__ == "__main__":
+    main()
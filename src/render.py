@@ -0,0 +1,99 @@
+import shutil
+import sys
+from io import StringIO
+from typing import TextIO
+
+from src.metrics import timed
+
+# Every cell but the last one of a row is this many columns wide on screen
+CELL_WIDTH = 6
+# Lines under the footer, the prompt and the one its answer moves down to
+PROMPT_LINES = 2
+
+Frame = list[list[str]]
+
+_cells: dict[str, str] = {}
+
+
+def card_cell(img: str) -> str:
+    """Board cell for a card image, built once per image and reused"""
+    cell = _cells.get(img)
+    if cell is None:
+        cell = _cells[img] = f"|{img}"
+    return cell
+
+
+def frame_to_str(frame: Frame) -> str:
+    return "\n".join("".join(row) for row in frame)
+
+
+class Renderer:
+    """Draws frames to the terminal, rewriting only the cells that changed
+
+    A frame is a list of rows and a row a list of cells. All cells of a row
+    are `CELL_WIDTH` columns wide except the last one, which may hold any
+    trailing text. The previous frame is kept so the next `draw` only sends
+    the cells that differ, addressed with ANSI cursor movement.
+
+    Cells are addressed by screen row, which only holds while the screen
+    has not scrolled. When the board, the footer and the prompt do not fit
+    in the terminal the frame is printed whole and the next one is too.
+    """
+
+    def __init__(self, out: TextIO = sys.stdout) -> None:
+        self.out: TextIO = out
+        self._prev: Frame | None = None
+
+    def invalidate(self) -> None:
+        """Redraw the whole screen on the next `draw`"""
+        self._prev = None
+
+    def _fits(self, frame: Frame, footer: str) -> bool:
+        if not self.out.isatty():
+            return True
+        size = shutil.get_terminal_size()
+        width = max(size.columns, 1)
+        lines = sum(-(-len(line) // width) or 1 for line in footer.splitlines())
+        return len(frame) + lines + PROMPT_LINES <= size.lines
+
+    @timed("render_seconds")
+    def draw(self, frame: Frame, footer: str = "") -> None:
+        """Show a frame with the footer text below it
+
+        Args:
+            frame (Frame): Board to show
+            footer (str, optional): Lines under the board, like a memo. Defaults to "".
+        """
+        footer = f"{footer}\n" if footer else ""
+        if not self._fits(frame, footer):
+            # The screen scrolls, no cell is left where the next draw expects it
+            self._prev = None
+            self.out.write(f"\033[H\033[2J{frame_to_str(frame)}\n{footer}")
+            self.out.flush()
+            return
+
+        buffer = StringIO()
+        prev = self._prev
+        if prev is None:
+            buffer.write("\033[H\033[2J")
+            prev = []
+
+        for r, row in enumerate(frame):
+            old = prev[r] if r < len(prev) else []
+            last = len(row) - 1
+            for c, cell in enumerate(row):
+                unchanged = c < len(old) and old[c] == cell
+                # The trailing cell also wipes what a longer old row left behind
+                if unchanged and (c != last or len(old) == len(row)):
+                    continue
+                buffer.write(f"\033[{r + 1};{c * CELL_WIDTH + 1}H{cell}")
+                if c == last:
+                    buffer.write("\033[K")
+            if not row and old:
+                buffer.write(f"\033[{r + 1};1H\033[K")
+
+        # Anything below the board, like the last prompt, is cleared
+        buffer.write(f"\033[{len(frame) + 1};1H\033[J{footer}")
+        self.out.write(buffer.getvalue())
+        self.out.flush()
+        self._prev = frame
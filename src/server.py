@@ -0,0 +1,411 @@
+"""Play solitaire over a local TCP line protocol
+
+Every connection gets its own game. The client sends one command per line
+in the grammar of `src.commands`, plus `b` for the board and `s` for the
+latency of its session, and every reply ends with a line holding a single
+dot. A new session first picks its game like the terminal does, `1` for
+Klondike or `2` for Yukon, optionally followed by a deal number and for
+Klondike the number of cards drawn at a time, 1 or 3.
+
+The searches behind the loss check after every move and behind hints run
+in a pool of worker processes on a copy of the position, so the event loop
+keeps answering other sessions meanwhile.
+
+    python -m src.server serve --port 8765
+    python -m src.server load --sessions 1000 --commands 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+from concurrent.futures import Executor, ProcessPoolExecutor
+from time import perf_counter
+from typing import Callable, TypeVar
+
+from src import commands
+from src.cache import VerdictCache
+from src.commands import auto_play_note, candidate_moves, parse_command
+from src.engine import AUTO, DRAW, DRAW_COUNTS, GAME_TYPES, Game
+from src.hints import HINT_BUDGET, Hint, format_hint, rank_hints
+from src.metrics import METRICS, Summary
+from src.solver import is_hopeless
+from src.state import State
+
+T = TypeVar("T")
+
+END_REPLY = "."
+# Longest command line accepted, anything longer closes the session
+MAX_LINE = 256
+
+
+class Session:
+    """One player's game, driven by command lines instead of `input()`
+
+    Args:
+        cache (VerdictCache): Loss check verdicts shared by all sessions
+        executor (Executor, optional): Worker processes for searches. Defaults to None (search in this thread).
+    """
+
+    __slots__ = ("cache", "executor", "game", "latency", "_spare")
+
+    def __init__(self, cache: VerdictCache, executor: Executor | None = None) -> None:
+        self.cache: VerdictCache = cache
+        self.executor: Executor | None = executor
+        self.game: Game | None = None
+        self.latency: Summary = Summary()
+        # The finished game, dealt again for the next one
+        self._spare: Game | None = None
+
+    def greeting(self) -> str:
+        return "1: Klondike\n2: Yukon"
+
+    async def handle(self, line: str) -> tuple[str, bool]:
+        """Run one command line
+
+        Returns:
+            tuple[str, bool]: The reply and whether the session goes on
+        """
+        start = perf_counter()
+        try:
+            if self.game is None:
+                return self._select(line), True
+            return await self._play(line)
+        finally:
+            elapsed = perf_counter() - start
+            self.latency.add(elapsed)
+            if METRICS.enabled:
+                METRICS.observe("server_command_seconds", elapsed)
+
+    def _select(self, line: str) -> str:
+        words = line.split()
+        if not 1 <= len(words) <= 3 or words[0] not in GAME_TYPES:
+            return self.greeting()
+        if not all(word.isdigit() for word in words[1:]):
+            return self.greeting()
+        deal = int(words[1]) if len(words) > 1 else None
+        draw = int(words[2]) if len(words) > 2 else 3
+        if draw not in DRAW_COUNTS:
+            return self.greeting()
+        if self._spare is None:
+            self.game = Game.new(GAME_TYPES[words[0]], deal, draw)
+        else:
+            self._spare.reset(deal, GAME_TYPES[words[0]], draw)
+            self.game, self._spare = self._spare, None
+        return f"Lets Play! Deal #{self.game.deal}\n{board(self.game)}"
+
+    async def _search(self, task: Callable[..., T], *args) -> T:
+        # The game stays untouched while the session waits for the reply
+        game = self.game
+        assert game is not None
+        if self.executor is None:
+            return task(game, self.cache, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            _run_task,
+            task,
+            game.variant,
+            game.draw,
+            game.snapshot(),
+            *args,
+        )
+
+    async def _play(self, line: str) -> tuple[str, bool]:
+        game = self.game
+        assert game is not None
+        text = line.strip().lower()
+        if text == "b":
+            return board(game), True
+        if text == "s":
+            return json.dumps(self.stats()), True
+
+        command = parse_command(line, game.variant)
+        match command.action:
+            case commands.QUIT:
+                return "Bye", False
+            case commands.NEW:
+                self._end_game()
+                return self.greeting(), True
+            case commands.UNDO:
+                if game.undo():
+                    return "Undo last move...", True
+                return "Nothing to undo...", True
+            case commands.REDO:
+                if game.redo():
+                    return "Redo move...", True
+                return "Nothing to redo...", True
+            case commands.HINT:
+                hints = await self._search(_rank_hints, HINT_BUDGET)
+                return "\n".join(format_hint(hint) for hint in hints), True
+            case commands.INVALID:
+                return "Invalid Move. Try again...", True
+
+        moves = candidate_moves(game, command)
+        if not moves:
+            return "Invalid Move. Try again...", True
+        if len(moves) > 1 and not 1 <= command.choice <= len(moves):
+            options = " ".join(
+                f"{i}:{game.stacks[move.source].cards[move.index]}"
+                for i, move in enumerate(moves, 1)
+            )
+            return f"Choose {options}", True
+        if moves[0] == AUTO:
+            played = game.auto_play()
+            return await self._after_move(f"Played {played} safe cards up..."), True
+        game.apply(moves[command.choice - 1 if len(moves) > 1 else 0])
+        if moves[0] == DRAW:
+            return await self._after_move("Draw cards from deck...."), True
+        return await self._after_move("Nice Move!"), True
+
+    async def _after_move(self, memo: str) -> str:
+        game = self.game
+        assert game is not None
+        if game.is_won():
+            game.auto_play()
+            self._end_game()
+            return f"***** YOU WIN ******\n{self.greeting()}"
+        if game.is_lost() or await self._search(is_hopeless):
+            self._end_game()
+            return f"***** NO MORE MOVES *****\n{self.greeting()}"
+        return memo + auto_play_note(game)
+
+    def _end_game(self) -> None:
+        self._spare, self.game = self.game, None
+
+    def stats(self) -> dict:
+        """Command count and latency of the session in seconds"""
+        return self.latency.as_dict()
+
+
+# Worker process state: its verdict cache and one game per rule set that
+# every searched position is restored into
+_worker_cache: VerdictCache | None = None
+_worker_games: dict[tuple[str, int], Game] = {}
+
+
+def _init_worker(cache_path: str | None) -> None:
+    global _worker_cache
+    _worker_cache = VerdictCache(cache_path)
+
+
+def _run_task(
+    task: Callable[..., T], variant: str, draw: int, state: State, *args
+) -> T:
+    game = _worker_games.get((variant, draw))
+    if game is None:
+        game = _worker_games[variant, draw] = Game.new(variant, draw=draw)
+    game.restore(state)
+    return task(game, _worker_cache, *args)
+
+
+def _rank_hints(game: Game, cache: VerdictCache | None, budget: float) -> list[Hint]:
+    return rank_hints(game, budget, cache)
+
+
+def board(game: Game) -> str:
+    """Plain text position, one stack per line, `??` for a face down card"""
+    lines = []
+    for stack_id in game.ACES + game.KINGS + [game.PULL]:
+        stack = game.stacks[stack_id]
+        cards = [
+            "??" if i < stack.hidden else str(card)
+            for i, card in enumerate(stack.cards)
+        ]
+        lines.append(f"{stack_id}: {' '.join(cards)}")
+    lines.append(f"deck: {len(game.deck)} moves: {game.moves}")
+    return "\n".join(lines)
+
+
+class Server:
+    """Asyncio server running one `Session` per connection
+
+    Searches run in `workers` processes, each with its own verdict cache.
+    They share the file of `cache` when it has one.
+
+    Args:
+        max_sessions (int, optional): Connections served at once, more are turned away. Defaults to 10_000.
+        idle_timeout (float, optional): Seconds a session may stay silent. Defaults to 600.
+        cache (VerdictCache, optional): Shared loss check verdicts. Defaults to None (new in memory cache).
+        workers (int, optional): Search processes, 0 searches on the event loop. Defaults to None (one per core).
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10_000,
+        idle_timeout: float = 600.0,
+        cache: VerdictCache | None = None,
+        workers: int | None = None,
+    ) -> None:
+        self.max_sessions: int = max_sessions
+        self.idle_timeout: float = idle_timeout
+        self.cache: VerdictCache = cache if cache is not None else VerdictCache()
+        self.workers: int = (os.cpu_count() or 1) if workers is None else workers
+        self.executor: Executor | None = None
+        self.sessions: set[Session] = set()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765) -> None:
+        if self.workers:
+            self.executor = ProcessPoolExecutor(
+                self.workers, initializer=_init_worker, initargs=(self.cache.path,)
+            )
+        try:
+            server = await asyncio.start_server(
+                self.handle, host, port, limit=MAX_LINE
+            )
+            async with server:
+                await server.serve_forever()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(cancel_futures=True)
+                self.executor = None
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        if len(self.sessions) >= self.max_sessions:
+            writer.write(f"Server is full\n{END_REPLY}\n".encode())
+            await _close(writer)
+            return
+
+        session = Session(self.cache, self.executor)
+        self.sessions.add(session)
+        try:
+            await _reply(writer, session.greeting())
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                if not line:
+                    break
+                reply, playing = await session.handle(line.decode(errors="replace"))
+                await _reply(writer, reply)
+                if not playing:
+                    break
+        except (asyncio.TimeoutError, ValueError, ConnectionError):
+            # Idle, over long lines and dropped connections end the session
+            pass
+        finally:
+            self.sessions.discard(session)
+            if METRICS.enabled and session.latency.count:
+                mean = session.latency.total / session.latency.count
+                METRICS.observe("session_mean_latency_seconds", mean)
+                METRICS.observe("session_max_latency_seconds", session.latency.maximum)
+            await _close(writer)
+
+
+async def _reply(writer: asyncio.StreamWriter, text: str) -> None:
+    writer.write(f"{text}\n{END_REPLY}\n".encode())
+    await writer.drain()
+
+
+async def _close(writer: asyncio.StreamWriter) -> None:
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except ConnectionError:
+        pass
+
+
+async def _read_reply(reader: asyncio.StreamReader) -> list[str]:
+    lines = []
+    while True:
+        line = (await reader.readline()).decode().rstrip("\n")
+        if line == END_REPLY or (not line and reader.at_eof()):
+            return lines
+        lines.append(line)
+
+
+async def play_session(
+    host: str, port: int, commands_per_session: int, seed: int
+) -> list[float]:
+    """Stand in for a player, sending hinted moves and draws
+
+    Returns:
+        list[float]: Round trip time of every command in seconds
+    """
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 16)
+    times = []
+
+    async def send(command: str) -> list[str]:
+        start = perf_counter()
+        writer.write(f"{command}\n".encode())
+        reply = await _read_reply(reader)
+        times.append(perf_counter() - start)
+        return reply
+
+    try:
+        await _read_reply(reader)
+        reply = await send(f"{rng.choice('12')} {seed}")
+        for _ in range(commands_per_session):
+            if reply and reply[0].startswith("1: Klondike"):
+                reply = await send(rng.choice("12"))
+                continue
+            # Hints come best first, chance then command on every line
+            hints = [line.split(maxsplit=1)[1] for line in await send("h") if line]
+            if hints and rng.random() < 0.8:
+                move = hints[0] if rng.random() < 0.5 else rng.choice(hints)
+                reply = await send(move)
+                if reply[0].startswith("Choose"):
+                    reply = await send(f"{move} 1")
+            else:
+                reply = await send(rng.choice(["d", "u", "n"]))
+        await send("q")
+    finally:
+        await _close(writer)
+    return times
+
+
+async def load(
+    host: str, port: int, sessions: int, commands_per_session: int
+) -> dict:
+    """Run many concurrent client sessions against a server"""
+    start = perf_counter()
+    results = await asyncio.gather(
+        *(
+            play_session(host, port, commands_per_session, seed)
+            for seed in range(sessions)
+        )
+    )
+    elapsed = perf_counter() - start
+    times = sorted(t for session in results for t in session)
+    return {
+        "sessions": sessions,
+        "commands": len(times),
+        "seconds": elapsed,
+        "commands_per_second": len(times) / elapsed if elapsed else 0.0,
+        "p50_ms": times[len(times) // 2] * 1000 if times else 0.0,
+        "p99_ms": times[int(len(times) * 0.99)] * 1000 if times else 0.0,
+        "max_ms": times[-1] * 1000 if times else 0.0,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Solitaire line protocol server")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    serve = sub.add_parser("serve", help="Run the server")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--max-sessions", type=int, default=10_000)
+    serve.add_argument(
+        "--workers", type=int, default=None, help="search processes, 0 for none"
+    )
+    client = sub.add_parser("load", help="Run test clients against a server")
+    client.add_argument("--host", default="127.0.0.1")
+    client.add_argument("--port", type=int, default=8765)
+    client.add_argument("--sessions", type=int, default=100)
+    client.add_argument("--commands", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    if args.mode == "serve":
+        try:
+            server = Server(args.max_sessions, workers=args.workers)
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        result = asyncio.run(load(args.host, args.port, args.sessions, args.commands))
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import argparse
+import json
+import os
+import random
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+from src.engine import DRAW_COUNTS, VARIANTS, Game, Move
+from src.metrics import METRICS
+from src.solver import ordered_moves
+
+Policy = Callable[[Game, random.Random], Move | None]
+
+
+def random_policy(game: Game, rng: random.Random) -> Move | None:
+    """Any legal move"""
+    moves = game.legal_moves()
+    return rng.choice(moves) if moves else None
+
+
+def greedy_policy(game: Game, rng: random.Random) -> Move | None:
+    """The most promising move that reaches a position not seen before"""
+    for move in ordered_moves(game):
+        game.apply(move)
+        fresh = game.seen() == 1
+        game.unapply()
+        if fresh:
+            return move
+    return None
+
+
+POLICIES: dict[str, Policy] = {"random": random_policy, "greedy": greedy_policy}
+
+
+class GameResult(NamedTuple):
+    deal: int
+    variant: str
+    policy: str
+    won: bool
+    moves: int
+    plies: int
+
+
+class Stats:
+    """Running win rate and game length, aggregated one result at a time"""
+
+    def __init__(self) -> None:
+        self.games: int = 0
+        self.wins: int = 0
+        self.moves: int = 0
+        self.plies: int = 0
+
+    def add(self, result: GameResult) -> None:
+        self.games += 1
+        self.wins += result.won
+        self.moves += result.moves
+        self.plies += result.plies
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.games if self.games else 0.0
+
+    @property
+    def mean_moves(self) -> float:
+        return self.moves / self.games if self.games else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "games": self.games,
+            "wins": self.wins,
+            "win_rate": self.win_rate,
+            "mean_moves": self.mean_moves,
+            "mean_plies": self.plies / self.games if self.games else 0.0,
+        }
+
+
+def play(
+    variant: str, deal: int, policy: str, max_plies: int = 1000, draw: int = 3
+) -> GameResult:
+    """Play one numbered deal headlessly until it is won, lost or runs too long
+
+    Args:
+        variant (str): 'klondike' or 'yukon'
+        deal (int): Number of the deal, also seeds the policy
+        policy (str): Name of a policy in `POLICIES`
+        max_plies (int, optional): Moves, draws included, before giving up. Defaults to 1000.
+        draw (int, optional): Cards turned per draw in klondike. Defaults to 3.
+
+    Returns:
+        GameResult: Outcome of the game
+    """
+    choose = POLICIES[policy]
+    rng = random.Random(deal)
+    game = Game.new(variant, deal, draw)
+    plies = 0
+    won = False
+    while plies < max_plies:
+        if game.is_won():
+            won = True
+            break
+        if game.is_lost():
+            break
+        move = choose(game, rng)
+        if move is None:
+            break
+        game.apply(move)
+        plies += 1
+    return GameResult(deal, variant, policy, won, game.moves, plies)
+
+
+def _play_chunk(
+    variant: str,
+    deals: range,
+    policy: str,
+    max_plies: int,
+    metrics_path: str | None = None,
+    draw: int = 3,
+) -> list[GameResult]:
+    if metrics_path:
+        METRICS.enable()
+    results = [play(variant, deal, policy, max_plies, draw) for deal in deals]
+    if metrics_path:
+        # Each worker keeps its own metrics file, rewritten after every chunk
+        METRICS.dump(f"{metrics_path}.{os.getpid()}")
+    return results
+
+
+def chunks(deals: range, chunk_size: int) -> Iterator[range]:
+    """Consecutive slices of `chunk_size` deals, the last one may be shorter"""
+    for start in range(0, len(deals), chunk_size):
+        yield deals[start : start + chunk_size]
+
+
+def simulate(
+    variant: str,
+    deals: range,
+    policy: str = "greedy",
+    workers: int | None = None,
+    chunk_size: int = 64,
+    max_plies: int = 1000,
+    metrics_path: str | None = None,
+    draw: int = 3,
+) -> Iterator[GameResult]:
+    """Play every numbered deal across a pool of processes
+
+    Deals are handed out in chunks and only a few chunks per worker are in
+    flight at a time, so memory stays flat however many deals are played.
+    Results are yielded as soon as their chunk finishes, in no fixed order.
+
+    Args:
+        variant (str): 'klondike' or 'yukon'
+        deals (range): Numbers of the deals to play
+        policy (str, optional): Name of a policy in `POLICIES`. Defaults to "greedy".
+        workers (int, optional): Worker processes. Defaults to None (one per core).
+        chunk_size (int, optional): Deals per task. Defaults to 64.
+        max_plies (int, optional): Moves per game before giving up. Defaults to 1000.
+        metrics_path (str, optional): Prefix of the per-worker metrics files. Defaults to None (no metrics).
+        draw (int, optional): Cards turned per draw in klondike. Defaults to 3.
+
+    Yields:
+        GameResult: Outcome of each game
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Invalid policy, must be one of {tuple(POLICIES)}")
+    workers = workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for chunk in chunks(deals, chunk_size):
+            pending.add(
+                executor.submit(
+                    _play_chunk, variant, chunk, policy, max_plies, metrics_path, draw
+                )
+            )
+            if len(pending) < workers * 4:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+        for future in completed(pending):
+            yield from future.result()
+
+
+def completed(pending: set) -> Iterable:
+    """Futures of `pending` as they finish"""
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        yield from done
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Simulate numbered solitaire deals")
+    parser.add_argument("--variant", choices=VARIANTS, default="klondike")
+    parser.add_argument("--policy", choices=tuple(POLICIES), default="greedy")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--first-deal", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--max-plies", type=int, default=1000)
+    parser.add_argument("--draw", type=int, choices=DRAW_COUNTS, default=3)
+    parser.add_argument(
+        "--results", help="write one JSON line per game to this file as it finishes"
+    )
+    parser.add_argument(
+        "--metrics", help="dump each worker's metrics to this path plus its pid"
+    )
+    args = parser.parse_args(argv)
+
+    deals = range(args.first_deal, args.first_deal + args.games)
+    stats = Stats()
+    log = open(args.results, "w") if args.results else None
+    try:
+        for result in simulate(
+            args.variant,
+            deals,
+            args.policy,
+            args.workers,
+            args.chunk_size,
+            args.max_plies,
+            args.metrics,
+            args.draw,
+        ):
+            stats.add(result)
+            if log:
+                log.write(json.dumps(result._asdict()) + "\n")
+    finally:
+        if log:
+            log.close()
+    summary = {
+        "variant": args.variant,
+        "draw": args.draw,
+        "policy": args.policy,
+        **stats.as_dict(),
+    }
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
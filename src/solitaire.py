@@ -1,220 +1,189 @@
-from copy import deepcopy
-from io import StringIO
-from os import name, system
 from time import sleep
+from typing import Iterator
 
 from src.card import Card
-from src.card_types import get_playing_cards
 from src.deck import Deck
+from src.engine import DRAW, GAME_TYPES, Game, Move
+from src import commands
+from src.cache import VerdictCache
+from src.commands import auto_play_note, parse_command
 from src.exceptions import EndGame, LoseGame, NewGame, WinGame
+from src.hints import HINT_BUDGET, format_hint, rank_hints
+from src.metrics import timed
+from src.record import Recorder
+from src.render import Frame, Renderer, card_cell, frame_to_str
+from src.solver import is_hopeless
 from src.stack import Stack
 
-GAME_TYPES = {"1": "klondike", "2": "yukon"}
+# Deals tried before a game may start out lost
+MAX_REDEALS = 20
+BLANK = "|     "
 PLAY_OPTIONS = {
     "klondike": [
         "[d] to draw cards",
+        "[a] auto-play",
         "[u] undo",
+        "[r] redo",
+        "[n] new game",
+        "[h] hints",
+        "[q] to quit",
+    ],
+    "yukon": [
+        "[a] auto-play",
+        "[u] undo",
+        "[r] redo",
         "[n] new game",
         "[h] hints",
         "[q] to quit",
     ],
-    "yukon": ["[u] undo", "[n] new game", "[h] hints", "[q] to quit"],
 }
 
 
 class Solitaire:
-    """A class to represent a game of solitaire"""
-
-    ACES = ["S", "C", "D", "H"]
-    KINGS = ["1", "2", "3", "4", "5", "6", "7"]
-    PULL = "P"
-    _curr_state: dict
-    _prev_state: dict
-
-    def __init__(self) -> None:
+    """A class to represent a game of solitaire in the terminal"""
+
+    ACES = Game.ACES
+    KINGS = Game.KINGS
+    PULL = Game.PULL
+    game: Game
+
+    def __init__(
+        self, recorder: Recorder | None = None, cache: VerdictCache | None = None
+    ) -> None:
+        self.recorder: Recorder | None = recorder
+        self.cache: VerdictCache = cache if cache is not None else VerdictCache()
         self.type: str = ""
-        self.deck: Deck = Deck(
-            get_playing_cards(card_values=list(range(13))), shuffled=True
-        )
-        self.stacks: dict[str, Stack] = {}
-        for k in self.KINGS:
-            self.stacks[k] = Stack(k, "KING")
-        for a in self.ACES:
-            self.stacks[a] = Stack(a, "ACE")
-        self.stacks["P"] = Stack("P", "PULL")
-        self.moves: int = 0
         self.win: bool = False
-        self._hashes: list[int] = []
         self._available_moves: int = 0
+        self._renderer: Renderer = Renderer()
+        # The one game every deal of this session is dealt into
+        self._pool: Game | None = None
+
+    @property
+    def deck(self) -> Deck:
+        return self.game.deck
+
+    @property
+    def stacks(self) -> dict[str, Stack]:
+        return self.game.stacks
+
+    @property
+    def moves(self) -> int:
+        return self.game.moves
 
     def __str__(self) -> str:
-        tableau = StringIO()
-        tableau.write(self._draw_aces_row())
-        tableau.write(self._draw_kings_row())
+        return frame_to_str(self._frame())
+
+    def _frame(self) -> Frame:
+        frame = self._draw_aces_row() + self._draw_kings_row()
 
         if self.type == "klondike":
-            pull_cards_cnt = max(len(self.stacks["P"]) * -1, -3)
-            white_space: int = pull_cards_cnt * -1 * 6 + 7
+            stock = [f"{self.deck.cards[-1].back_img} " if self.deck else " " * 6]
             if not self.stacks["P"]:
-                tableau.write("\n\n")
-                if self.deck:
-                    tableau.write(f"\n{self.deck.cards[-1].back_img} ")
-                else:
-                    tableau.write("\n      ")
+                frame += [[], [], [], stock]
             else:
-                tableau.write(f"\n{'|  P  |':>{white_space}}\n")
-                tableau.write(f"{'+-----+':>{white_space}}\n")
-                if self.deck:
-                    tableau.write(f"{self.deck.cards[-1].back_img} ")
-                else:
-                    tableau.write("      ")
+                pull_cards_cnt = max(len(self.stacks["P"]) * -1, -3)
+                white_space: int = pull_cards_cnt * -1 * 6 + 7
+                frame.append([])
+                frame.append([f"{'|  P  |':>{white_space}}"])
+                frame.append([f"{'+-----+':>{white_space}}"])
                 for i in range(pull_cards_cnt, 0):
-                    tableau.write(f" {self.stacks['P'].cards[i].img}")
-            tableau.write("\n")
-
-        tableau.write(f"Available Moves: {self._available_moves}")
+                    stock.append(f" {self.stacks['P'].cards[i].front_img}")
+                frame.append(stock)
 
-        return tableau.getvalue()
+        frame.append([f"Available Moves: {self._available_moves}"])
+        return frame
 
     def __hash__(self) -> int:
-        return hash(tuple(self.stacks.values()))
+        return hash(self.game)
 
     def _refresh(self, memo: str = "", show_options: bool = True) -> None:
-        _ = system("cls") if name == "nt" else system("clear")
-        print(self)
-        print(memo)
+        footer = memo
         if show_options:
-            print("Options:", " | ".join(PLAY_OPTIONS[self.type]))
-
-    def _draw_aces_row(self):
-        tableau_ace = StringIO()
-        for col in self.ACES:
-            tableau_ace.write(f"|{col:^5}")
-        tableau_ace.write(f"|{'Moves':>17}\n")
-        tableau_ace.write(f"{'+-----' * 4}+{' ' * 12}-----\n")
-        for col in self.ACES:
-            if self.stacks[col]:
-                card = self.stacks[col].cards[-1]
-                tableau_ace.write(f"|{card.img}")
-            else:
-                tableau_ace.write("|     ")
-        tableau_ace.write(f"|{' ' * 12}{self.moves:^5,}\n\n")
-        return tableau_ace.getvalue()
-
-    def _draw_kings_row(self) -> str:
-        tableau_king = StringIO()
+            footer += "\nOptions: " + " | ".join(PLAY_OPTIONS[self.type])
+        self._renderer.draw(self._frame(), footer)
+
+    def _draw_aces_row(self) -> Frame:
+        header = [f"|{col:^5}" for col in self.ACES]
+        header.append(f"|{'Moves':>17}")
+        cards = [
+            card_cell(self.stacks[col].cards[-1].front_img)
+            if self.stacks[col]
+            else BLANK
+            for col in self.ACES
+        ]
+        cards.append(f"|{' ' * 12}{self.moves:^5,}")
+        return [header, [f"{'+-----' * 4}+{' ' * 12}-----"], cards, []]
+
+    def _draw_kings_row(self) -> Frame:
         tallest = max((len(y) for x, y in self.stacks.items() if x in self.KINGS))
         tallest = max((13, tallest))
-        for col in self.KINGS:
-            tableau_king.write(f"|{col:^5}")
-        tableau_king.write(f"|\n{'+-----' * 7}+\n")
+        rows = [
+            [f"|{col:^5}" for col in self.KINGS] + ["|"],
+            [f"{'+-----' * 7}+"],
+        ]
         for row in range(tallest):
+            cells = []
             for col in self.KINGS:
-                if self.stacks.get(col) and row < len(self.stacks[col]):
-                    card: Card = self.stacks[col].cards[row]
-                    tableau_king.write(f"|{card.img}")
+                stack = self.stacks.get(col)
+                if stack and row < len(stack):
+                    card: Card = stack.cards[row]
+                    img = card.back_img if row < stack.hidden else card.front_img
+                    cells.append(card_cell(img))
                 else:
-                    tableau_king.write("|     ")
-            tableau_king.write("|\n")
-        return tableau_king.getvalue()
+                    cells.append(BLANK)
+            cells.append("|")
+            rows.append(cells)
+        return rows
 
-    def _get_state(self) -> dict:
-        _state = {
-            "stacks": {},
-            "draw_cards": self.stacks["P"].cards[:],
-            "deck_cards": self.deck.cards[:],
-            "moves": self.moves,
-            "hashses": self._hashes[:],
-        }
-
-        for stack in self.KINGS + self.ACES:
-            _state["stacks"][stack] = deepcopy(self.stacks[stack].cards)
-
-        return _state
+    def _check_end(self) -> None:
+        if self._check_win():
+            raise WinGame
+        if self._check_lost():
+            raise LoseGame
 
     def _check_win(self) -> bool:
-        if self.deck or self.stacks["P"]:
+        if not self.game.is_won():
             return False
-        for i in self.KINGS:
-            stack = self.stacks[i]
-            if not stack:
-                continue
-            if stack.cards[0].face_down:
-                return False
-            for n, card in enumerate(self.stacks[i].cards[1:], 1):
-                prev_card = self.stacks[i].cards[n - 1]
-                if not _is_valid_king_position(prev_card, card):
-                    return False
 
         self._finish_game()
         return True
 
     def _check_lost(self) -> bool:
-        # CREATE SNAPSHOT OF CURRENT GAME
-        # RUN THRU EACH STACK TO CHECK FOR VALID MOVE
-        # MAKE MOVE; VERIFY HASH AFTER MOVE IS NOT ALREADY IN self._hashes
-        #   IF HASH DOES NOT EXIST - RETURN FALSE
-        #   IF HASH DOES EXIST - CONTINUE TO CHECK
-        # IF FOR LOOP IS COMPLETED WITHOUT RETURN THEN RETURN TRUE
-        if self.type == "klondike":
-            return False
-
-        self._curr_state = self._get_state()
-        self._available_moves = 0
-
-        for i in self.ACES + self.KINGS:
-            for j in self.ACES + self.KINGS:
-                if j == i:
-                    continue
-                self._available_moves += len(self.stacks[i].valid_moves(self.stacks[j]))
-        if self._available_moves >= 1:
-            return False
-        return True
+        self._available_moves = sum(
+            1 for move in self.game.legal_moves() if move != DRAW
+        )
+        return is_hopeless(self.game, self.cache)
 
     def _hints(self) -> str:
-        # curr_state = self._get_state()
-        moves = []
-        for i in self.ACES + self.KINGS:
-            for j in self.ACES + self.KINGS:
-                if j == i:
-                    continue
-                if self.stacks[i].valid_moves(self.stacks[j]):
-                    moves.append(f"{j}{i}")
-        return "\n".join(moves)
+        hints = rank_hints(self.game, HINT_BUDGET, self.cache)
+        return "\n".join(format_hint(hint) for hint in hints)
 
-    def _is_valid_move(self, move_from_stack: str, move_to_stack: str) -> bool:
-        if move_from_stack.upper() not in self.stacks:
-            return False
-        if move_to_stack.upper() not in self.stacks:
-            return False
-        to_stack: Stack = self.stacks[move_to_stack.upper()]
-        from_stack: Stack = self.stacks[move_from_stack.upper()]
-        available_moves = to_stack.valid_moves(from_stack)
-
-        if not available_moves:
-            return False
-        return True
-
-    def _move_stack(self, move_from_stack: str, move_to_stack: str) -> bool:
-        if move_from_stack.upper() not in self.stacks:
-            return False
-        if move_to_stack.upper() not in self.stacks:
-            return False
-        to_stack: Stack = self.stacks[move_to_stack.upper()]
-        from_stack: Stack = self.stacks[move_from_stack.upper()]
-        available_moves = to_stack.valid_moves(from_stack)
+    @timed("move_stack_seconds")
+    def _move_stack(
+        self, move_from_stack: str, move_to_stack: str, choice: int = 0
+    ) -> bool:
+        from_col = move_from_stack.upper()
+        to_col = move_to_stack.upper()
+        available_moves = self.game.move_options(from_col, to_col)
 
         if not available_moves:
             return False
         if len(available_moves) == 1:
             start_index = available_moves[0]
-        elif len(available_moves) > 1:
+        elif 1 <= choice <= len(available_moves):
+            # Picked on the command line, like the `72 2` of a hint
+            start_index = available_moves[choice - 1]
+        else:
+            from_stack: Stack = self.stacks[from_col]
             s = "\n".join(
                 [
-                    f"{i}: {from_stack.cards[card_index].img}"
+                    f"{i}: {from_stack.cards[card_index].front_img}"
                     for i, card_index in enumerate(available_moves, 1)
                 ]
             )
+            # The choices are printed under the prompt and may scroll the board
+            self._renderer.invalidate()
             while True:
                 player_input = input(s + "\nEnter Choice (leave blank to abort): ")
                 if not player_input:
@@ -230,127 +199,112 @@ class Solitaire:
                         continue
                     else:
                         break
-        else:
-            return False
-
-        self._prev_state = self._get_state()
-        self.moves += 1
-        to_stack.add(*from_stack.pop(start_index))
-
-        if from_stack:
-            from_stack.cards[-1].face_down = False
-
-        self._hashes.append(hash(self))
-
-        self._curr_state = self._get_state()
 
+        if not self.game.apply(Move(from_col, to_col, start_index)):
+            return False
+        self._record()
         return True
 
-    def _pull_cards(self) -> None:
-        if len(self.deck) >= 3:
-            self.stacks["P"].cards += self.deck.cards[:3]
-            self.deck.cards = self.deck.cards[3:]
-
-        elif 0 < len(self.deck) < 3:
-            self.stacks["P"].cards += self.deck.cards[:]
-            self.deck.cards = []
-
-        elif not self.deck and self.stacks["P"]:
-            self.deck.cards = self.stacks["P"].cards[:]
-            self.stacks["P"].clear()
-            self._pull_cards()
-
-    def _init_tableau(self) -> None:
-        for i in range(1, 8):
-            card = self.deck.deal_card()
-            self.stacks[str(i)].add(card)
-
-            for j in range(i + 1, 8):
-                card = self.deck.deal_card(face_down=True)
-                self.stacks[str(j)].add(card)
-
-        if self.type == "yukon":
-            for _ in range(4):
-                for i in range(2, 8):
-                    card = self.deck.deal_card()
-                    self.stacks[str(i)].add(card)
-
-            if self._check_lost():
-                raise LoseGame
-
-        self._prev_state = {}
-        self._hashes = [hash(self)]
-
-    def _undo(self) -> None:
-        if self._prev_state:
-            for stack in self.KINGS + self.ACES:
-                self.stacks[stack].cards = self._prev_state["stacks"][stack][:]
-            self.stacks["P"].cards = self._prev_state["draw_cards"][:]
-            self.deck.cards = self._prev_state["deck_cards"][:]
-            self.moves = self._prev_state["moves"]
+    def _record(self) -> None:
+        if self.recorder and self.game.last_delta:
+            self.recorder.move(self.game.last_delta)
 
+    @timed("process_command_seconds")
     def _process_command(self, command: str) -> str:
-        def move_to_ace(command: str) -> str:
-            card = self.stacks[command.upper()].cards[-1]
-            if self._move_stack(command, card.suit):
-                if self._check_win():
-                    raise WinGame
-                if self._check_lost():
-                    raise LoseGame
-                return "Nice Move!"
+        def move(from_col: str, to_col: str, choice: int = 0) -> str:
+            if self._move_stack(from_col, to_col, choice):
+                self._check_end()
+                return "Nice Move!" + auto_play_note(self.game)
             return "Invalid Move. Try again..."
 
-        match command:
-            case "q":  # quit game
+        parsed = parse_command(command, self.type)
+        match parsed.action:
+            case commands.QUIT:
+                self._renderer.invalidate()
                 if input("Are you sure you want to quit? [y]: ").upper() == "Y":
                     raise EndGame
                 return "Lets Play!"
-            case "n":  # new game
+            case commands.NEW:
+                self._renderer.invalidate()
                 if (
                     input("Are you sure you want start a new game? [y]: ").upper()
                     == "Y"
                 ):
                     raise NewGame
                 return "Lets Play!"
-            case "u":  # undo last move
-                self._undo()
-                return "Undo last move..."
-            case "d" if self.type == "klondike":  # draw cards from deck
-                self._prev_state = self._get_state()
-                self._pull_cards()
-                return "Draw cards from deck...."
-            case "p" if self.type == "klondike":
-                return move_to_ace(command)
-            case "h":
+            case commands.UNDO:  # undo last move
+                if self.game.undo():
+                    if self.recorder:
+                        self.recorder.undo()
+                    return "Undo last move..."
+                return "Nothing to undo..."
+            case commands.REDO:  # redo last undone move
+                if self.game.redo():
+                    if self.recorder:
+                        self.recorder.redo()
+                    return "Redo move..."
+                return "Nothing to redo..."
+            case commands.DRAW_CARDS:  # draw cards from deck
+                if self.game.apply(DRAW):
+                    self._record()
+                    self._check_end()
+                return "Draw cards from deck...." + auto_play_note(self.game)
+            case commands.AUTO_PLAY:  # every safe card to the foundations
+                played = self.game.auto_play()
+                if not played:
+                    return "No safe cards to play..."
+                self._record()
+                self._check_end()
+                return f"Played {played} safe card{'s' if played > 1 else ''} up..."
+            case commands.HINT:
                 return self._hints()
-            case command if command in self.KINGS and self.stacks[command]:
-                return move_to_ace(command)
-            case command if len(command) == 2:
-                from_col = command[0]
-                to_col = command[1]
-                if self._move_stack(from_col, to_col):
-                    if self._check_win():
-                        raise WinGame
-                    if self._check_lost():
-                        raise LoseGame
-                    return "Nice Move!"
-                return "Invalid Move. Try Again..."
+            case commands.FOUNDATION if self.stacks[parsed.source]:
+                return move(parsed.source, self.stacks[parsed.source].cards[-1].suit)
+            case commands.MOVE:
+                return move(parsed.source, parsed.target, parsed.choice)
             case _:
                 return "Invalid Move. Try again..."
 
-    def start_game(self) -> bool:
-        """Start game play"""
+    def run(self, deals: Iterator[int] | None = None) -> None:
+        """Play games one after another until the player quits
+
+        A loop rather than a new call per game, and every game is dealt
+        into the same `Game`, so a session can go on for days without its
+        stack or memory growing.
+
+        Args:
+            deals (Iterator[int], optional): Deal numbers to play in order. Defaults to None (random deals).
+        """
+        while self.start_game(next(deals, None) if deals is not None else None):
+            pass
+
+    def start_game(self, deal: int | None = None) -> bool:
+        """Play one game
+
+        Args:
+            deal (int, optional): 64-bit deal number. Defaults to None (random deal).
+
+        Returns:
+            bool: True if the player wants to play another game
+        """
         game_select = input("\n1: Klondike\n2: Yukon\n:")
-        if game_select not in GAME_TYPES:
-            self.start_game()
+        while game_select not in GAME_TYPES:
+            game_select = input("\n1: Klondike\n2: Yukon\n:")
 
         self.type = GAME_TYPES[game_select]
+        self.win = False
+        # The menu was printed under the last board
+        self._renderer.invalidate()
 
-        self._init_tableau()
-        memo = "Lets Play!"
+        self._deal(deal)
+        if self.recorder:
+            self.recorder.start(self.game)
+        memo = f"Lets Play! Deal #{self.game.deal}"
 
         # Game Loop
         try:
+            if self._check_lost():
+                raise LoseGame
             while True:
                 self._refresh(memo=memo)
                 command = input("Enter move: ").lower()
@@ -372,30 +326,23 @@ class Solitaire:
             return True
         except EndGame:
             return False
+        finally:
+            if self.recorder:
+                self.recorder.end()
+
+    def _deal(self, deal: int | None = None) -> None:
+        """Deal a new game, random deals are dealt again while lost from the start"""
+        for _ in range(1 if deal is not None else MAX_REDEALS):
+            if self._pool is None:
+                self._pool = Game.new(self.type, deal)
+            else:
+                self._pool.reset(deal, self.type)
+            self.game = self._pool
+            if not self._check_lost():
+                return
 
     def _finish_game(self):
-        while True:
-            for stack in self.KINGS:
-                if self.stacks[stack]:
-                    break
-            else:
-                break
-
-            for num, stack in self.stacks.items():
-                if num in self.KINGS and stack:
-                    while True:
-                        if not stack:
-                            break
-                        card = stack.cards[-1]
-                        if not self._move_stack(num, card.suit):
-                            break
-                        sleep(0.25)
-                        self._refresh(show_options=False)
-
-
-def _is_valid_king_position(upper_card: Card, lower_card: Card) -> bool:
-    if upper_card.color == lower_card.color:
-        return False
-    if upper_card.value != lower_card.value + 1:
-        return False
-    return True
+        for _ in self.game.finish():
+            self._record()
+            sleep(0.25)
+            self._refresh(show_options=False)
@@ -0,0 +1,175 @@
+from enum import Enum
+from time import perf_counter
+from typing import TYPE_CHECKING, NamedTuple
+
+from src.engine import DRAW, Game, Move
+
+# Node budget of the search after every move, it proves hopeless
+# positions long before the moves run out
+LOSS_CHECK_NODES = 200
+
+if TYPE_CHECKING:
+    from src.cache import VerdictCache
+
+
+class Verdict(Enum):
+    SOLVABLE = "solvable"
+    UNSOLVABLE = "unsolvable"
+    UNKNOWN = "unknown"
+
+
+class Solution(NamedTuple):
+    """Result of a search, `moves` is the winning line when solvable"""
+
+    verdict: Verdict
+    moves: list[Move]
+    nodes: int
+
+
+def solve(
+    game: Game,
+    max_nodes: int = 200_000,
+    cache: "VerdictCache | None" = None,
+    deadline: float | None = None,
+) -> Solution:
+    """Depth first search for a win from the current position
+
+    Positions are recorded in a transposition table keyed by the game's
+    Zobrist key, so every position is expanded at most once. Moves are
+    tried best first and a safe foundation move is played without
+    branching at all.
+
+    The search runs on `game` itself and leaves it at the position it
+    started from, the moves that could be redone included.
+
+    With a cache a known position is answered by a lookup, without the
+    winning line, and every new verdict is stored for the next search.
+    The cache is keyed by `Game.canonical_key`, so one verdict answers
+    every symmetric copy of a position.
+
+    Args:
+        game (Game): Game to solve
+        max_nodes (int, optional): Positions to expand before giving up. Defaults to 200_000.
+        cache (VerdictCache, optional): Verdicts of earlier searches. Defaults to None.
+        deadline (float, optional): `perf_counter()` time to give up at, the verdict is then unknown. Defaults to None (no time limit).
+
+    Returns:
+        Solution: The verdict with the winning line and the number of expanded positions
+    """
+    if game.is_won():
+        return Solution(Verdict.SOLVABLE, [], 0)
+    canonical_key = game.canonical_key if cache is not None else 0
+    if cache is not None:
+        cached = cache.get(canonical_key, max_nodes)
+        if cached is not None:
+            return Solution(cached.verdict, [], 0)
+
+    table: set[int] = {game.key}
+    path: list[Move] = []
+    frontier = [iter(ordered_moves(game))]
+    nodes = 0
+    verdict = Verdict.UNSOLVABLE
+
+    while frontier:
+        move = next(frontier[-1], None)
+        if move is None:
+            frontier.pop()
+            if path:
+                path.pop()
+                game.unapply()
+            continue
+
+        game.apply(move, keep_redo=True)
+        key = game.key
+        if key in table:
+            game.unapply()
+            continue
+        table.add(key)
+        nodes += 1
+        path.append(move)
+
+        if game.is_won():
+            verdict = Verdict.SOLVABLE
+            break
+        if nodes >= max_nodes or (deadline is not None and perf_counter() >= deadline):
+            verdict = Verdict.UNKNOWN
+            break
+        frontier.append(iter(ordered_moves(game)))
+
+    line = path[:]
+    for _ in path:
+        game.unapply()
+    if verdict != Verdict.SOLVABLE:
+        line = []
+    if cache is not None:
+        # A search cut short by the deadline only vouches for the nodes it saw
+        budget = nodes if verdict == Verdict.UNKNOWN else max_nodes
+        cache.put(canonical_key, verdict, budget)
+    return Solution(verdict, line, nodes)
+
+
+def is_hopeless(game: Game, cache: "VerdictCache | None" = None) -> bool:
+    """No move is left or a search of `LOSS_CHECK_NODES` proves the game lost"""
+    if game.is_lost():
+        return True
+    return solve(game, LOSS_CHECK_NODES, cache).verdict == Verdict.UNSOLVABLE
+
+
+def ordered_moves(game: Game) -> list[Move]:
+    """Legal moves, most promising first
+
+    A safe move to the foundations dominates every other move, so when
+    there is one it is the only move returned. Empty columns are
+    interchangeable, only moves onto the first of them are kept.
+    """
+    moves = distinct_moves(game, game.legal_moves())
+    for move in moves:
+        if is_safe_foundation_move(game, move):
+            return [move]
+    return sorted(moves, key=lambda move: move_priority(game, move))
+
+
+def distinct_moves(game: Game, moves: list[Move]) -> list[Move]:
+    """Moves without those onto empty columns other than the first one"""
+    empty = None
+    kept = []
+    for move in moves:
+        if move.target in game.KINGS and not game.stacks[move.target]:
+            if empty is None:
+                empty = move.target
+            elif move.target != empty:
+                continue
+        kept.append(move)
+    return kept
+
+
+def is_safe_foundation_move(game: Game, move: Move) -> bool:
+    """Moving the card up can never block another card, see `Game.is_safe`
+
+    A card off the waste is only safe drawing one at a time. Drawing three,
+    taking it away regroups the rest of the stock on every later pass, so
+    the move does not dominate the others.
+    """
+    if move.target not in game.ACES or move.source in game.ACES:
+        return False
+    if move.source == game.PULL and game.draw != 1:
+        return False
+    return game.is_safe(game.stacks[move.source].cards[-1])
+
+
+def move_priority(game: Game, move: Move) -> int:
+    """Search order of a move, lower goes first"""
+    if move == DRAW:
+        return 5
+    if move.source in game.ACES:
+        return 6
+    if move.target in game.ACES:
+        return 0
+    if move.source == game.PULL:
+        return 3
+    from_stack = game.stacks[move.source]
+    if move.index > 0 and from_stack.is_face_down(move.index - 1):
+        return 1
+    if move.index == 0:
+        return 2
+    return 4
@@ -1,7 +1,42 @@
+from src import zobrist
 from src.card import Card
+from src.card_types import FACES, SUITS
+from src.metrics import timed
+
+RED_SUITS = ("D", "H")
+# Row index for an empty stack in the lookup tables below
+EMPTY = len(FACES) * len(SUITS)
+
+
+def _can_build_down(top: int, card: int) -> bool:
+    if top == EMPTY:
+        return card % 13 == 12
+    top_red = SUITS[top // 13] in RED_SUITS
+    card_red = SUITS[card // 13] in RED_SUITS
+    return top_red != card_red and card % 13 == top % 13 - 1
+
+
+def _can_build_up(top: int, card: int) -> bool:
+    if top == EMPTY:
+        return card % 13 == 0
+    return card // 13 == top // 13 and card % 13 == top % 13 + 1
+
+
+# TABLEAU_OK[top][card]: `card` can be placed on `top` in the tableau and
+# FOUNDATION_OK[top][card] on a foundation, both indexed by card id
+TABLEAU_OK: list[bytes] = [
+    bytes(_can_build_down(top, card) for card in range(EMPTY))
+    for top in range(EMPTY + 1)
+]
+FOUNDATION_OK: list[bytes] = [
+    bytes(_can_build_up(top, card) for card in range(EMPTY))
+    for top in range(EMPTY + 1)
+]
 
 
 class Stack:
+    """Pile of cards, the first `hidden` of them lie face down"""
+
     locations = ["ACE", "KING", "PULL"]
 
     def __init__(self, id: str, location: str) -> None:
@@ -10,6 +45,9 @@ class Stack:
         self.id: str = id
         self.location: str = location
         self.cards: list[Card] = []
+        self.hidden: int = 0
+        self.key: int = 0
+        self._keys: list[int] = zobrist.table(id)
 
     def __len__(self) -> int:
         return len(self.cards)
@@ -18,7 +56,7 @@ class Stack:
         return len(self.cards) > 0
 
     def __hash__(self) -> int:
-        return hash(tuple(self.cards))
+        return self.key
 
     def __iter__(self):
         self.current_index = 0
@@ -31,26 +69,59 @@ class Stack:
             return x
         raise StopIteration
 
-    def add(self, *cards: Card) -> None:
+    def add(self, *cards: Card, face_down: bool = False) -> None:
+        if face_down and self.hidden != len(self.cards):
+            raise ValueError("Face down cards cannot go on a face up card")
         for card in cards:
             if not isinstance(card, Card):
                 raise ValueError("Expected argument card to be class<'Card'>")
 
+            self.key ^= zobrist.card_key(self._keys, len(self.cards), card, face_down)
             self.cards.append(card)
+        if face_down:
+            self.hidden = len(self.cards)
 
     def clear(self):
         self.cards = []
+        self.hidden = 0
+        self.key = 0
+
+    def is_face_down(self, index: int = -1) -> bool:
+        if index < 0:
+            index += len(self.cards)
+        return 0 <= index < self.hidden
+
+    def rehash(self) -> None:
+        """Recompute the Zobrist key after `cards` was replaced wholesale"""
+        self.key = zobrist.stack_key(self._keys, self.cards, self.hidden)
+
+    def flip(self) -> None:
+        """Turn the top card over, keeping the Zobrist key current"""
+        depth = len(self.cards) - 1
+        face_down = self.hidden > depth
+        if depth < 0 or self.hidden < depth:
+            raise ValueError("Only the top card of the face down cards can flip")
+        card = self.cards[depth]
+        self.key ^= zobrist.card_key(self._keys, depth, card, face_down)
+        self.key ^= zobrist.card_key(self._keys, depth, card, not face_down)
+        self.hidden = depth if face_down else depth + 1
 
     def pop(self, index: int = -1) -> list[Card]:
         if not -1 <= index < len(self.cards):
             raise IndexError("index out of range")
 
+        if index < 0:
+            index += len(self.cards)
         remove_cards = self.cards[index:]
+        for depth, card in enumerate(remove_cards, index):
+            self.key ^= zobrist.card_key(self._keys, depth, card, depth < self.hidden)
         self.cards = self.cards[:index]
-        if self.cards:
-            self.cards[-1].face_down = False
+        self.hidden = min(self.hidden, index)
+        if self.cards and self.hidden == len(self.cards):
+            self.flip()
         return remove_cards
 
+    @timed("valid_moves_seconds")
     def valid_moves(self, from_stack: "Stack") -> list:
         if not from_stack.cards:
             return []
@@ -62,6 +133,8 @@ class Stack:
 
 
 def valid_move_to_ace(from_stack: Stack, to_stack: Stack) -> list:
+    if from_stack.is_face_down():
+        return []
     if valid_ace_order(to_stack, from_stack.cards[-1]):
         return [len(from_stack.cards) - 1]
     return []
@@ -73,17 +146,26 @@ def valid_move_to_king(from_stack: Stack, to_stack: Stack) -> list:
             # Cannot move Ace back down
             return []
     if from_stack.location != "KING":
+        if from_stack.is_face_down():
+            return []
         if valid_king_order(to_stack, from_stack.cards[-1]):
             return [len(from_stack.cards) - 1]
         return []
 
+    if to_stack.cards:
+        if to_stack.is_face_down():
+            return []
+        fits = TABLEAU_OK[to_stack.cards[-1].id]
+    else:
+        fits = TABLEAU_OK[EMPTY]
+
     valid_moves = []
-    for i, card in enumerate(from_stack.cards):
+    for i in range(from_stack.hidden, len(from_stack.cards)):
         # If King at top position, can't move it to another empty column
-        if i == 0 and not card.face_down and card.face == "K":
+        if i == 0 and not to_stack.cards:
             continue
 
-        if not card.face_down and valid_king_order(to_stack, card):
+        if fits[from_stack.cards[i].id]:
             valid_moves.append(i)
     return valid_moves
 
@@ -91,18 +173,13 @@ def valid_move_to_king(from_stack: Stack, to_stack: Stack) -> list:
 def valid_ace_order(ace_stack: Stack, card: Card) -> bool:
     if card.suit != ace_stack.id:
         return False
-    if len(ace_stack.cards) == 0 and card.face == "A":
-        return True
-    if ace_stack.cards and card.value == ace_stack.cards[-1].value + 1:
-        return True
-    return False
+    top = ace_stack.cards[-1].id if ace_stack.cards else EMPTY
+    return bool(FOUNDATION_OK[top][card.id])
 
 
 def valid_king_order(king_stack: Stack, card: Card) -> bool:
-    if not king_stack.cards and card.face == "K":
-        return True
-    if king_stack.cards and card.color == king_stack.cards[-1].color:
+    if not king_stack.cards:
+        return bool(TABLEAU_OK[EMPTY][card.id])
+    if king_stack.is_face_down():
         return False
-    if king_stack.cards and card.value == king_stack.cards[-1].value - 1:
-        return True
-    return False
+    return bool(TABLEAU_OK[king_stack.cards[-1].id][card.id])
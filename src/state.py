@@ -0,0 +1,95 @@
+from typing import NamedTuple, Sequence
+
+from src.card import Card
+
+# Card ids are 0-51 in the low six bits, bit 6 (0x40) marks a face down card
+FACE_DOWN = 0x40
+ID_MASK = 0x3F
+RANKS = 13
+# Never a card code, separates the stacks of a canonical form
+COLUMN_END = b"\xff"
+PILE_END = b"\xfe"
+
+
+def _suit_swap(*pairs: tuple[int, int]) -> bytes:
+    # `bytes.translate` table exchanging every card of two suits, by suit index
+    table = bytearray(range(256))
+    for a, b in pairs:
+        for rank in range(RANKS):
+            for flag in (0, FACE_DOWN):
+                table[a * RANKS + rank | flag] = b * RANKS + rank | flag
+                table[b * RANKS + rank | flag] = a * RANKS + rank | flag
+    return bytes(table)
+
+
+# Suit indexes follow `SUITS`, clubs and spades are black, diamonds and hearts red
+_IDENTITY = _suit_swap()
+_BLACK_SWAP = _suit_swap((0, 3))
+_RED_SWAP = _suit_swap((1, 2))
+_BOTH_SWAP = _suit_swap((0, 3), (1, 2))
+
+
+class State(NamedTuple):
+    """Compact snapshot of a game, one byte per card"""
+
+    stacks: tuple[bytes, ...]
+    deck: bytes
+    moves: int
+
+
+def encode_cards(cards: list[Card], hidden: int = 0) -> bytes:
+    """Encode a stack whose first `hidden` cards lie face down"""
+    data = bytearray(card.id for card in cards)
+    for i in range(hidden):
+        data[i] |= FACE_DOWN
+    return bytes(data)
+
+
+def decode_cards(data: bytes, cards_by_id: list[Card]) -> tuple[list[Card], int]:
+    """Look up the shared `Card` objects of an encoded stack
+
+    Args:
+        data (bytes): Encoded cards
+        cards_by_id (list[Card]): Cards indexed by card id
+
+    Returns:
+        tuple[list[Card], int]: Cards and the number of them lying face down
+    """
+    cards = [cards_by_id[code & ID_MASK] for code in data]
+    hidden = 0
+    while hidden < len(data) and data[hidden] >= FACE_DOWN:
+        hidden += 1
+    return cards, hidden
+
+
+def canonical_form(
+    columns: Sequence[bytes], foundations: Sequence[int], piles: Sequence[bytes] = ()
+) -> bytes:
+    """Encoding shared by every position that differs only by symmetry
+
+    Tableau columns are interchangeable, so they are sorted. Two suits of
+    the same color whose foundations are equally high can trade all their
+    cards without changing the game, the smallest encoding over those
+    swaps is kept.
+
+    Args:
+        columns (Sequence[bytes]): Encoded tableau columns
+        foundations (Sequence[int]): Foundation height per suit, in `SUITS` order
+        piles (Sequence[bytes], optional): Encoded stacks whose place matters, such as the waste and stock. Defaults to ().
+
+    Returns:
+        bytes: The canonical encoding
+    """
+    swaps = [_IDENTITY]
+    if foundations[0] == foundations[3]:
+        swaps.append(_BLACK_SWAP)
+    if foundations[1] == foundations[2]:
+        swaps += [_RED_SWAP, _BOTH_SWAP] if len(swaps) == 2 else [_RED_SWAP]
+    head = bytes(foundations)
+    return min(
+        head
+        + COLUMN_END.join(sorted(column.translate(swap) for column in columns))
+        + PILE_END
+        + PILE_END.join(pile.translate(swap) for pile in piles)
+        for swap in swaps
+    )
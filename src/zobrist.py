@@ -0,0 +1,41 @@
+import random
+
+from src.card import Card
+
+STACK_IDS = ("1", "2", "3", "4", "5", "6", "7", "S", "C", "D", "H", "P", "DECK")
+MAX_DEPTH = 52
+# Every card id has a face up and a face down key
+CODES = 104
+
+_rng = random.Random(0x5A17)
+_TABLES: dict[str, list[int]] = {
+    stack_id: [_rng.getrandbits(64) for _ in range(MAX_DEPTH * CODES)]
+    for stack_id in STACK_IDS
+}
+
+
+# Salts the key of games drawing other than three cards at a time
+_DRAW_KEYS: dict[int, int] = {3: 0, 1: _rng.getrandbits(64)}
+
+
+def table(stack_id: str) -> list[int]:
+    """Zobrist keys of a stack, indexed by depth and card code"""
+    return _TABLES[stack_id]
+
+
+def draw_key(draw: int) -> int:
+    """Key mixed into every position of a klondike game drawing `draw` cards"""
+    return _DRAW_KEYS[draw]
+
+
+def card_key(keys: list[int], depth: int, card: Card, face_down: bool = False) -> int:
+    """Key of `card` lying at `depth` of the stack that owns `keys`"""
+    return keys[depth * CODES + (card.id << 1 | face_down)]
+
+
+def stack_key(keys: list[int], cards: list[Card], hidden: int = 0) -> int:
+    """Key of a whole stack whose first `hidden` cards lie face down"""
+    key = 0
+    for depth, card in enumerate(cards):
+        key ^= card_key(keys, depth, card, depth < hidden)
+    return key
@@ -0,0 +1,9 @@
+import pickle
+
+from src.card_types import get_playing_cards
+
+
+def test_unpickled_cards_are_the_shared_instances():
+    deck = get_playing_cards(card_values=list(range(13)))
+    restored = pickle.loads(pickle.dumps(deck))
+    assert all(card is shared for card, shared in zip(restored, deck))
@@ -0,0 +1,39 @@
+import random
+
+from src.engine import Game
+from src.record import Recorder, game_at, replay_file
+
+
+def _play(recorder: Recorder, deal: int, plies: int) -> Game:
+    game = Game.new("klondike", deal, 3)
+    recorder.start(game)
+    rng = random.Random(deal)
+    for _ in range(plies):
+        moves = game.legal_moves()
+        if not moves:
+            break
+        game.apply(rng.choice(moves))
+        recorder.move(game.last_delta)
+    return game
+
+
+def test_games_after_a_killed_session_are_read(tmp_path):
+    path = str(tmp_path / "games.rec")
+    games = []
+    recorder = Recorder(path)
+    for deal in (1, 2):
+        games.append(_play(recorder, deal, 30))
+        recorder.end()
+    # The process dies mid game, the record never gets its end marker
+    games.append(_play(recorder, 3, 25))
+    recorder._data.flush()
+    recorder._index.flush()
+
+    recorder = Recorder(path)
+    for deal in (4, 5):
+        games.append(_play(recorder, deal, 30))
+    recorder.close()
+
+    replayed = [game.key for _, game in replay_file(path)]
+    assert replayed == [game.key for game in games]
+    assert [game_at(path, n).deal for n in range(5)] == [1, 2, 3, 4, 5]
@@ -0,0 +1,18 @@
+from src.engine import Game, Move
+from src.solver import Verdict, is_hopeless, solve
+
+
+def test_waste_card_up_is_not_forced_drawing_three():
+    # Playing the waste card up regroups the stock, the win needs another move first
+    game = Game.new("klondike", 154, 3)
+    assert game.apply(Move("4", "1", 3))
+    assert game.apply(Move("1", "7", 0))
+
+    assert not is_hopeless(game)
+    solution = solve(game, 20_000)
+    assert solution.verdict == Verdict.SOLVABLE
+
+    replay = Game.new("klondike", 154, 3)
+    for move in game.history + solution.moves:
+        assert replay.apply(move)
+    assert replay.is_won()